@@ -33,8 +33,23 @@ then be used to instantiate PDU objects of this format, e.g., Ethernet frames.
 
 __all__ = ["PDUFormatError", "PDU", "formatFactory"]
 
-import copy
 import struct
+import sys
+from binascii import hexlify, unhexlify
+
+_PDU_END = sys.maxint
+"""Slice index beyond the end of any PDU.
+
+Used for the end of fields that end with the PDU, since such fields
+may have a negative start and the index 0 can then not mark the end."""
+
+_ORD = dict([(chr(i), i) for i in range(256)])
+"""Integer value of each octet. Indexing is faster than calling ord()."""
+_CHR = [chr(i) for i in range(256)]
+"""Octet of each integer value. Indexing is faster than calling chr()."""
+_INT_STRUCTS = {1: struct.Struct(">B"), 2: struct.Struct(">H"),
+                4: struct.Struct(">I")}
+"""Precompiled formats of the Int fields of a common width in octets."""
 
 
 class PDUFormatError(Exception):
@@ -67,7 +82,7 @@ class PDU(object):
         Return value: Bitstream.
 
         """
-        return self._data[:-1]
+        return self._data
         
     def fill(self, bitstream):
         """Parse the bitstream and set the value of all PDU fields.
@@ -80,10 +95,10 @@ class PDU(object):
         Return value: None.
         """
 
-        self._data = bitstream+"\x00"
+        self._data = bitstream
 
 
-def _propertyFactory(type, start, end, length):
+def _propertyFactory(fieldType, start, end, length):
     """Create a property with a get and a set method for a PDU field.
 
     This function is called by the formatFactory to create a property
@@ -98,151 +113,319 @@ def _propertyFactory(type, start, end, length):
     writing of the field.
 
     Arguments:
-      type:FieldType -- Type of the field, like ('ByteField', 'BitField',
-                                                 'MACAddr', 'IPv4Addr', 'Int')
+      fieldType:FieldType -- Type of the field, like ('ByteField',
+                             'BitField', 'MACAddr', 'IPv4Addr', 'Int')
       start:Int -- Position of the first bit of the field in the packet.
                    Attention: may be negative, to count from the back
       end:Int -- Position of the first bit of the next field.
-                 The last field of the packet is always a hidden sentinel of
-                 one octet, such that end always has a defined value.
-                 Attention: may be negative to count from the back.
+                 Attention: may be negative to count from the back. Is 0
+                 if the field is the last one of a packet.
       length:Int -- Length of the field in bits.
     Return value: A property to that can be added to a class.
       """
-    
-    if type == 'ByteField':
-        start /= 8
-        end /= 8
-
-        def getfield(self):
-            return self._data[start:end]
-
-        def setfield(self, value):
-            self._data = self._data[:start]+value+self._data[end:]
-
-    elif type == 'Int':
-        start /= 8
-        length /= 8
-        end /= 8
-        pad = "\x00"*8
-        def getfield(self):
-            octets = self._data[start:end]
-            return struct.unpack("!q", pad[0:-length]+octets)[0]
-
-        def setfield(self, value):
-            if value >= 1L<<(length*8):
-                raise ValueError("Value "+ `value`+ " too large for IntField of "
-                                 + `length` + " octets")
-            
-            octets = struct.pack("!q", value)[-length:]
-            self._data = self._data[:start]+octets+self._data[end:]
-            
-    elif type == "IPv4Addr":
-        start /= 8
-        length /= 8
-        end /= 8
-        
-        def getfield(self):
-            octets = self._data[start:end]
-            ints = struct.unpack("!BBBB", octets)
-            return "%d.%d.%d.%d"%ints
-        
-        def setfield(self, value):
-            ints = [int(s) for s in value.split('.')]
-            args = ["!BBBB"]+ints
-            octets = struct.pack(*args)
-            self._data = self._data[:start]+octets+self._data[end:]
-
-    elif type == 'MACAddr':
-        start /= 8
-        length /= 8
-        end /= 8
-        
-        def getfield(self):
-            octets = self._data[start:end]
-            ints = struct.unpack("!BBBBBB", octets)
-            return "%02X:%02X:%02X:%02X:%02X:%02X"%ints
-
-        def setfield(self, value):
-            value = long(value.replace(":", ""),16)
-            octets = struct.pack("!Q", value)[-length:]
-            self._data = self._data[:start]+octets+self._data[end:]
-
-    elif type == 'BitField':
-        firstOctet, offset = divmod(start,8)
-        lastOctet = (end-1) / 8
-        trailbits = (8 - (end % 8)) % 8
-        if firstOctet == lastOctet:
-            # Bitfield in a single octet. Use fast and simple functions
-            mask = ((1<<length)-1)<<trailbits
-            invmask = ~mask
-            def getfield(self):
-                octet = self._data[firstOctet]
-                return (ord(octet) & mask)>>trailbits
-            def setfield(self, value):
-                if value >= (1<<length):
-                    raise ValueError("Value "+ `value`
-                                     + " too large for BitField of "
-                                     + `length` + " bits")
-                value <<= trailbits
-                octet = self._data[firstOctet]                
-                octet = chr(ord(octet) & invmask | value)
-                self._data = (self._data[:firstOctet] + octet 
-                              + self._data[firstOctet+1:])
-        else:
-            # Bitfield crosses octet boundary. Use more complex functions
-            startmask = (1<<(8-offset))-1
-            endmask = ~((1<<trailbits)-1)
-            def getfield(self):
-                value = 0
-                octets = self._data[firstOctet:lastOctet+1]
-                value = ord(octets[0]) & startmask
-                for octet in octets[1:-1]:
-                    value = value * 256 + ord(octet)
-                value = (value * (1<<(8-trailbits)) 
-                         + ((ord(octets[-1]) & endmask)>>trailbits))
-                return value
-            def setfield(self, value):
-                if value >= (1L<<length):
-                    raise ValueError("Value "+ `value`
-                                     + " too large for BitField of "
-                                     + `length` + " bits")
-                value, rem = divmod(value,1<<(8-trailbits))
-                octet = self._data[lastOctet]
-                newData = chr(ord(octet) & (~endmask) | (rem<<trailbits))
-                for i in range(firstOctet+1,lastOctet):
-                    value, rem = divmod(value, 256)
-                    newData = chr(rem)+newData
-                octet = self._data[firstOctet]
-                newData = chr(ord(octet) & (~startmask) | value) + newData
-                self._data = (self._data[:firstOctet] + newData 
-                              + self._data[lastOctet+1:])
-                
+    getfield, setfield = _fieldFactories[fieldType](start, end, length)
     return property(getfield, setfield, None, "")
 
 
-def _initFactory(defaultdata):
-    """Return an init function of the new class that sets default values."""
-    def init(self):
-        self._data = defaultdata
-    return init
+def _byteFieldFactory(start, end, length):
+    """Return the get and set functions of a ByteField.
+
+    The arguments are the same as for _propertyFactory.
+    """
+    start /= 8
+    end = end/8 or _PDU_END
+
+    def getfield(self):
+        return self._data[start:end]
+
+    def setfield(self, value):
+        self._data = self._data[:start]+value+self._data[end:]
+
+    return getfield, setfield
+
+
+def _intFactory(start, end, length):
+    """Return the get and set functions of an Int field.
+
+    The arguments are the same as for _propertyFactory.
+    """
+    start /= 8
+    length /= 8
+    end = end/8 or _PDU_END
+    if length in _INT_STRUCTS:
+        return _structIntFactory(start, end, length, _INT_STRUCTS[length])
+    pad = "\x00"*8
+    def getfield(self):
+        octets = self._data[start:end]
+        return struct.unpack("!q", pad[0:-length]+octets)[0]
+
+    def setfield(self, value):
+        if value >= 1L<<(length*8):
+            raise ValueError("Value "+ `value`+ " too large for IntField of "
+                             + `length` + " octets")
+        
+        octets = struct.pack("!q", value)[-length:]
+        self._data = self._data[:start]+octets+self._data[end:]
+
+    return getfield, setfield
+
+
+def _structIntFactory(start, end, length, fmt):
+    """Return the get and set functions of an Int field of 1, 2 or 4 octets.
+
+    The field is decoded by a precompiled Struct of its own width.
+    Arguments start, end and length are given in octets.
+    """
+    unpack = fmt.unpack
+    pack = fmt.pack
+    mask = (1L<<(length*8)) - 1
+    def getfield(self):
+        return unpack(self._data[start:end])[0]
+
+    def setfield(self, value):
+        if value >= 1L<<(length*8):
+            raise ValueError("Value "+ `value`+ " too large for IntField of "
+                             + `length` + " octets")
+        # Negative values are stored as their two's complement low octets
+        self._data = self._data[:start]+pack(value & mask)+self._data[end:]
+
+    return getfield, setfield
+
+
+def _ipv4AddrFactory(start, end, length):
+    """Return the get and set functions of an IPv4Addr field.
+
+    The arguments are the same as for _propertyFactory.
+    """
+    start /= 8
+    end = end/8 or _PDU_END
+    
+    def getfield(self):
+        octets = self._data[start:end]
+        ints = struct.unpack("!BBBB", octets)
+        return "%d.%d.%d.%d"%ints
+    
+    def setfield(self, value):
+        ints = [int(s) for s in value.split('.')]
+        args = ["!BBBB"]+ints
+        octets = struct.pack(*args)
+        self._data = self._data[:start]+octets+self._data[end:]
+
+    return getfield, setfield
+
+
+def _macAddrFactory(start, end, length):
+    """Return the get and set functions of a MACAddr field.
+
+    The arguments are the same as for _propertyFactory.
+    """
+    start /= 8
+    end = end/8 or _PDU_END
+    
+    def getfield(self):
+        h = hexlify(self._data[start:end]).upper()
+        return ":".join((h[0:2], h[2:4], h[4:6], h[6:8], h[8:10], h[10:12]))
+
+    def setfield(self, value):
+        octets = unhexlify(value.replace(":", ""))
+        if len(octets) != 6:
+            raise ValueError("Invalid MAC address " + `value`)
+        self._data = self._data[:start]+octets+self._data[end:]
+
+    return getfield, setfield
 
 
-def _classFactory(_slots,_format,_protocolEntity):
+def _bitFieldFactory(start, end, length):
+    """Return the get and set functions of a BitField.
+
+    The arguments are the same as for _propertyFactory.
+    """
+    firstOctet, offset = divmod(start,8)
+    trailbits = (8 - (end % 8)) % 8
+    # start and end may have different signs when the field ends
+    # the packet. Count the octets from the field length.
+    nbOctets = (offset + length + 7) / 8
+    nextOctet = firstOctet + nbOctets or _PDU_END
+    if nbOctets > 1:
+        # Bitfield crosses octet boundary. Generate functions that
+        # access each octet of the field directly.
+        return _crossOctetFactory(firstOctet, nextOctet, offset, trailbits,
+                                  length)
+
+    # Bitfield in a single octet. Use fast and simple functions
+    mask = ((1<<length)-1)<<trailbits
+    invmask = ~mask
+    def getfield(self):
+        octet = self._data[firstOctet]
+        return (_ORD[octet] & mask)>>trailbits
+    def setfield(self, value):
+        if value >= (1<<length):
+            raise ValueError("Value "+ `value`
+                             + " too large for BitField of "
+                             + `length` + " bits")
+        value <<= trailbits
+        octet = self._data[firstOctet]                
+        octet = _CHR[_ORD[octet] & invmask | value]
+        self._data = (self._data[:firstOctet] + octet 
+                      + self._data[nextOctet:])
+
+    return getfield, setfield
+
+
+def _crossOctetFactory(firstOctet, nextOctet, offset, trailbits, length):
+    """Return the get and set functions of a BitField spanning octets.
+
+    The positions, masks and shifts of the field are known when the PDU
+    class is created. The source code of the two functions is therefore
+    generated for this particular field, with one expression per octet,
+    such that no loop over the octets has to be executed when the field
+    is accessed.
+
+    Arguments:
+      firstOctet:Int -- Index of the first octet of the field. May be
+                        negative to count from the back.
+      nextOctet:Int -- Index of the octet following the field.
+      offset:Int -- Number of bits preceding the field in its first octet.
+      trailbits:Int -- Number of bits following the field in its last
+                       octet.
+      length:Int -- Length of the field in bits.
+    Return value: Tuple (getfield, setfield).
+    """
+    nbOctets = (offset + length + 7) / 8
+    lastOctet = firstOctet + nbOctets - 1
+    startmask = (1<<(8-offset)) - 1
+    endmask = (1<<trailbits) - 1
+
+    # Shift of each octet of the field, from the first to the last one.
+    shifts = [8*(nbOctets-1-i) - trailbits for i in range(nbOctets)]
+
+    getter = ["(_ORD[data[%d]] & %d) << %d" % (firstOctet, startmask,
+                                                shifts[0])]
+    setter = ["_CHR[_ORD[data[%d]] & %d | value >> %d]" % (firstOctet,
+                                                          0xFF & ~startmask,
+                                                          shifts[0]+trailbits)]
+    for i in range(1, nbOctets-1):
+        getter.append("_ORD[data[%d]] << %d" % (firstOctet+i, shifts[i]))
+        setter.append("_CHR[value >> %d & 255]" % (shifts[i]+trailbits))
+    getter.append("_ORD[data[%d]] >> %d" % (lastOctet, trailbits))
+    setter.append("_CHR[_ORD[data[%d]] & %d | value & 255]" % (lastOctet,
+                                                               endmask))
+
+    source = """
+def getfield(self):
+    data = self._data
+    return %s
+
+def setfield(self, value):
+    if value >= %dL:
+        raise ValueError("Value "+ `value`
+                         + " too large for BitField of %d bits")
+    data = self._data
+    value <<= %d
+    self._data = (data[:%d] + %s
+                  + data[%d:])
+""" % (" | ".join(getter), 1L<<length, length, trailbits, firstOctet,
+       " + ".join(setter), nextOctet)
+
+    namespace = {"_ORD": _ORD, "_CHR": _CHR}
+    exec source in namespace
+    return namespace["getfield"], namespace["setfield"]
+
+
+_fieldFactories = {'ByteField': _byteFieldFactory,
+                   'Int': _intFactory,
+                   'IPv4Addr': _ipv4AddrFactory,
+                   'MACAddr': _macAddrFactory,
+                   'BitField': _bitFieldFactory}
+"""Function creating the get and set functions, for each field type."""
+
+
+def _encodeDefaults(types, lengths, defaults, start, totalLength):
+    """Return the default content of a PDU.
+
+    The default values of all fields are encoded in one pass over the
+    format and written into a single buffer, in the same way as the set
+    functions created by _propertyFactory would do it.
+
+    Arguments:
+      types, lengths, defaults:Tuple -- Type, length and default value of
+                                        each field of the format.
+      start:List -- Position of the first bit of each field, as passed
+                    to _propertyFactory. Negative positions count from
+                    the back.
+      totalLength:Int -- Length of the PDU in octets, without the variable
+                         length field.
+    Return value: String of the default PDU content.
+    """
+    data = bytearray(totalLength)
+    variable, varOctet = "", 0
+    for pos in range(len(types)):
+        fieldType, length, default = types[pos], lengths[pos], defaults[pos]
+        first = start[pos]
+        if length == None:
+            variable, varOctet = default or "", first/8
+            continue
+        if default == None:
+            continue
+        if first < 0:
+            first += totalLength*8
+
+        if fieldType == 'BitField':
+            if default >= (1L<<length):
+                raise ValueError("Value "+ `default`
+                                 + " too large for BitField of "
+                                 + `length` + " bits")
+            end = first + length
+            trailbits = (8 - (end % 8)) % 8
+            value = default << trailbits
+            for i in range((end-1)/8, first/8-1, -1):
+                value, rem = divmod(value, 256)
+                data[i] |= rem
+            continue
+
+        if fieldType == 'ByteField':
+            octets = default
+        elif fieldType == 'Int':
+            if default >= 1L<<length:
+                raise ValueError("Value "+ `default`+ " too large for IntField"
+                                 + " of " + `length/8` + " octets")
+            octets = struct.pack("!q", default)[-length/8:]
+        elif fieldType == 'IPv4Addr':
+            ints = [int(s) for s in default.split('.')]
+            octets = struct.pack("!BBBB", *ints)
+        elif fieldType == 'MACAddr':
+            octets = unhexlify(default.replace(":", ""))
+            if len(octets) != 6:
+                raise ValueError("Invalid MAC address " + `default`)
+        data[first/8:first/8+length/8] = octets
+
+    data[varOctet:varOctet] = variable
+    return str(data)
+
+
+def _classFactory(_slots,_format,_protocolEntity,_defaultdata):
     """Return a new class for a PDU type."""
     class newFormat(PDU):
         __slots__ = _slots+('_data',)
         format = _format
         protocolEntity = _protocolEntity
         """Protocol entity that used the PDU. Used for packet tracing."""
+        def __init__(self):
+            """Create a PDU whose fields have their default values."""
+            self._data = _defaultdata
     return newFormat
 
 
-def _checkformat(format):
-    """Verify that the format, that defines a new PDU class, is correct."""
+def _checkformat(types, lengths):
+    """Verify that the format, that defines a new PDU class, is correct.
+
+    Arguments:
+      types, lengths:Tuple -- Type and length of each field of the format.
+    Return value: None.
+    """
     variableLen = 0
     start,end = 0,0
-    for name, type, length, default in format:
+    for type, length in zip(types, lengths):
         if length == None:
             if type != "ByteField":
                 raise PDUFormatError("Only ByteField can have an unspecified "+
@@ -250,7 +433,7 @@ def _checkformat(format):
             variableLen += 1
             length = 0
         end += length
-        if type not in ("ByteField", "BitField", "MACAddr", "IPv4Addr", "Int"):
+        if type not in _fieldFactories:
             raise PDUFormatError("Unknown PDU field type: " + type)
 
         if type == 'ByteField':
@@ -282,6 +465,61 @@ def _checkformat(format):
         raise PDUFormatError("Multiple variable length fields in PDU format")
 
 
+_layoutCache = {}
+"""Layouts computed by _formatLayout, indexed by the format as tuple."""
+
+def _formatLayout(format):
+    """Compute the layout of a PDU format.
+
+    Verifies the format, determines the position of each field and creates
+    the default content of the PDU and the properties to access the fields.
+
+    Argument:
+      format:PDUFormat -- Description of the packet fields.
+    Return value: Tuple (slots, defaultdata, properties) where slots are the
+                  field names, defaultdata the default PDU content and
+                  properties a list of (name, property).
+    """
+    # Work on one sequence per field attribute, such that each of the
+    # following steps only walks the attributes it needs.
+    names, types, lengths, defaults = zip(*format) or ((), (), (), ())
+    _checkformat(types, lengths)
+    slots = tuple([intern(name) for name in names])
+
+    # Determine the start and end indices of fields. Fields following a
+    # variable length field are positioned from the back.
+    if None in lengths:
+        variable = lengths.index(None)
+    else:
+        variable = len(lengths)
+    start = [0]
+    for length in lengths[:variable]:
+        start.append(start[-1] + length)
+    totalLength = start[-1]
+    if variable < len(lengths):
+        tail = [0]
+        for length in reversed(lengths[variable+1:]):
+            tail.append(tail[-1] - length)
+        tail.reverse()
+        start.extend(tail)
+        totalLength -= tail[0]
+
+    totalLength,rem = divmod(totalLength,8)
+    if rem != 0:
+        raise PDUFormatError("Total PDU length must be a multiple of 8 bits")
+    defaultdata = _encodeDefaults(types, lengths, defaults, start,
+                                  totalLength)
+
+    # Create the property functions to access the PDU fields
+    properties = []
+    for pos in range(len(names)):
+        p = _propertyFactory(types[pos], start[pos], start[pos+1],
+                             lengths[pos])
+        properties.append((names[pos], p))
+
+    return slots, defaultdata, properties
+
+
 def formatFactory(format, protocolEntity):
     """Create a new class (not an object, but a class) for a PDU type.
 
@@ -337,53 +575,20 @@ def formatFactory(format, protocolEntity):
     Return value: A new PDU class.
     """
 
-    _checkformat(format)
-    
-    # Create the new class
-    slots = tuple([name for name, type, length, default in format])
-    newFormat = _classFactory(slots, format, protocolEntity)
-
-    # Determine the start and end indices of fields, taking into account
-    # variable length fields
-    formatcopy = copy.copy(format)
-    start1 = []
-    pos = 0
-    for name, type, length, default in format:
-        del formatcopy[0]
-        start1.append(pos)
-        if length == None:
-            break
-        else:
-            pos += length
-    totalLength = pos
-    
-    start2 = [-8] # Last octet of data is a sentinel
-    pos = -8
-    formatcopy.reverse()
-    for name, type, length, default in formatcopy:
-        pos -= length
-        start2.append(pos)
-    totalLength -= pos
-    start2.reverse()
-    start=start1+start2
-
-    totalLength,rem = divmod(totalLength,8)
-    if rem != 0:
-        raise PDUFormatError("Total PDU length must be a multiple of 8 bits")
-    newFormat.__init__ = _initFactory("\x00"*totalLength)
+    # The layout of the fields only depends on the format. It is computed
+    # once and shared by all classes created from the same format, e.g.,
+    # the frame classes of all MAC entities of a network.
+    key = tuple(format)
+    try:
+        slots, defaultdata, properties = _layoutCache[key]
+    except KeyError:
+        slots, defaultdata, properties = _formatLayout(format)
+        _layoutCache[key] = slots, defaultdata, properties
 
-    # Create the property functions to access the PDU fields
-    pos = 0
-    for name, type, length, default in format:
-        p = _propertyFactory(type, start[pos], start[pos+1], length)
+    # Create the new class
+    newFormat = _classFactory(slots, format, protocolEntity, defaultdata)
+    for name, p in properties:
         setattr(newFormat, name, p)
-        pos += 1
-
-    pdu = newFormat()
-    for name, type, length, default in format:
-        if default != None:
-            setattr(pdu, name, default)
-    newFormat.__init__ = _initFactory(pdu.serialize()+"\x00")    
 
     return newFormat
 
@@ -555,5 +760,20 @@ if __name__ == '__main__':
     assert(pdu2.Longbit4 == int("0010101011110011111",2))
     assert(pdu2.Shortbit6 == int("011",2))
     assert(pdu2.In2 == 23231231)
+
+    # Negative Int values are stored as their two's complement low octets
+    IntPDUClass = formatFactory([("I1", "Int", 8, None),
+                                 ("I2", "Int", 16, None),
+                                 ("I4", "Int", 32, None),
+                                 ("I3", "Int", 24, None)], None)
+    pdu3 = IntPDUClass()
+    pdu3.I1 = -3
+    pdu3.I2 = -310
+    pdu3.I4 = -70000
+    pdu3.I3 = -5
+    assert(pdu3.serialize() == struct.pack("!q", -3)[-1:]
+           + struct.pack("!q", -310)[-2:] + struct.pack("!q", -70000)[-4:]
+           + struct.pack("!q", -5)[-3:])
+    assert(pdu3.I2 == 65226)
     
     print "All tests passed"
@@ -28,21 +28,30 @@ scheduler takes care of executing the events in the correct chronological
 order.
 
 The functions are implemented by a class Scheduler. It is a simple
-list based and single threaded discrete event scheduler.
+heap based and single threaded discrete event scheduler.
 """
 
 __all__ = ["Scheduler"]
 
-import bisect
+from heapq import heappush, heappop
+from itertools import count
 
 class Scheduler:
     """Discrete event scheduler.
 
-    Simple list based and single threaded event scheduler.
+    Simple heap based and single threaded event scheduler.
+
+    An event is a list [time, priority, action, arguments, pending]. The
+    heap holds tuples (time, priority, sequence number, event), so that
+    events with the same time and priority are executed in their scheduling
+    order. Cancelled events stay in the heap with pending set to False and
+    are discarded when they are reached.
     """
     
     def __init__(self):
         self.queue = []
+        self._pending = 0 # Number of events in the queue not yet cancelled
+        self._seq = count()
         self.simtime = 0
         self.singleStep = False
         self.running = False
@@ -64,11 +73,12 @@ class Scheduler:
         Return value: eventId -- Handle of the scheduled event.
         """
         if self.simtime <= time <= self.maxtime:
-            event = time, priority, action, arguments
-            bisect.insort_right(self.queue, event)
+            event = [time, priority, action, arguments, True]
+            heappush(self.queue, (time, priority, next(self._seq), event))
+            self._pending += 1
             return event # The ID
         else:
-            return (time, priority, action, arguments)
+            return [time, priority, action, arguments, False]
 
     def enter(self, delay, action, arguments=(), priority=10):
         """Schedule a new action after a delay.
@@ -91,11 +101,13 @@ class Scheduler:
             eventID -- Event handle as returned by the SCHEDULE functions.
         Return value: None.
         """
-        try:
-            self.queue.remove(event)
-        except ValueError:
+        if event[4]:
+            # Leave the event in the heap. It is skipped by the event loop.
+            event[4] = False
+            self._pending -= 1
+        else:
             # This should only happen if the event time is passed the maxtime
-            time,priority,action,arguments = event
+            time,priority,action,arguments,pending = event
             if time <= self.maxtime:
                 # This is a program error of the simulation
                 raise RuntimeError("CANCEL of non-existing event:\n" +
@@ -104,7 +116,7 @@ class Scheduler:
 
     def empty(self):
         """Return True if the event queue is empty, otherwise false."""
-        return len(self.queue) == 0
+        return self._pending == 0
 
     def run(self,until=10e300):
         """Run the simulation.
@@ -157,7 +169,7 @@ class Scheduler:
 
         Return value: None.
         """
-        del self.queue[:] # delete all pending events
+        self._clear() # delete all pending events
         if self.running and not self.singleStep:
             # Event loop is active. Let it terminate and clean up
             self.maxtime = 0.0 # do not accept new events anymore
@@ -190,7 +202,7 @@ class Scheduler:
         """
         if not self.running:
             print "Cleaning up"
-            del self.queue[:]
+            self._clear()
             self.simtime = 0.0
             self.maxtime = 10e300
             self.running = False
@@ -205,6 +217,13 @@ class Scheduler:
         behavior, e.g., sleep for a while.
         """
         self.simtime = self.simtime+delay
+
+    def _clear(self):
+        """Delete all scheduled events."""
+        for entry in self.queue:
+            entry[3][4] = False
+        del self.queue[:]
+        self._pending = 0
         
     def _eventloop(self):
         """Execute the scheduled events at their event time.
@@ -213,19 +232,24 @@ class Scheduler:
         """
         q = self.queue
         while q and self.running:
-            time, priority, action, arguments = q.pop(0)
+            event = heappop(q)[3]
+            if not event[4]:
+                continue # Cancelled event
+            event[4] = False
+            self._pending -= 1
+            time, priority, action, arguments, pending = event
             now = self.simtime
             if now < time:
                 self._delayfunc(time - now)
             void = action(*arguments)
             
-            if self.singleStep and q:
+            if self.singleStep and self._pending:
                 # Single step mode and simulation is not yet finished. Return
                 return self.simtime
             
         # Simulation has been halted, terminated or it has finished.
         self.running = False
-        if q:
+        if self._pending:
             # Events remaining. I have been halted.
             return self.simtime
         else:
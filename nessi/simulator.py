@@ -50,17 +50,20 @@ or simulation scripts:
 - REGISTER_ACTOR: Start collecting activity indications of an actor
 - UNREGISTER_ACTOR: Stop collecting activity indications of an actor
 - RANDOM_SEED: Initialize the random number generator with a seed
+- RUN_REPLICAS: Run independent replicas of a simulation in parallel
 """
 __all__ = ["SCHEDULE", "SCHEDULEABS", "CANCEL", "TIME", "RUN", "CONTINUE",
            "HALT", "TERMINATE", "REINITIALIZE",
            "TRACE", "START_FILE_TRACE", "STOP_FILE_TRACE", "FLUSH_TRACE_FILES",
            "REGISTER_LISTENER", "UNREGISTER_LISTENER", "NEW_SAMPLER",
            "ACTIVITY_INDICATION", "REGISTER_ACTOR", "UNREGISTER_ACTOR",
-           "RANDOM_SEED"]
+           "RANDOM_SEED", "RUN_REPLICAS"]
 
 import scheduler
 import trace
 import random
+import numpy
+import multiprocessing
 
 _sched = scheduler.Scheduler()
 _traceCollector = trace.TraceCollector(_sched.now)
@@ -295,5 +298,38 @@ Return value: None.
 """
 
 def RANDOM_SEED(s):
-    """Initialize the random number generator with a seed"""
+    """Initialize the random number generators with a seed"""
     random.seed(s)
+    #numpy only takes unsigned 32 bit integers: reduce any hashable seed to that
+    numpy.random.seed(hash(s) & 0xFFFFFFFF)
+
+def RUN_REPLICAS(simulation, seeds, processes=None):
+    """Run independent replicas of a simulation in parallel processes.
+
+    Each replica runs in a fresh worker process, with its own scheduler,
+    traces and random number generators seeded with one of the seeds. The simulation
+    function must build the network, run it and return its results.
+    It is called with the seed as argument. It must be defined at module
+    level and its results must be picklable, e.g. numbers or MacStat
+    objects. Combining the results is left to the caller.
+
+    Arguments:
+        simulation:function -- function that builds and runs one replica
+        seeds:list -- random seed of each replica
+        processes:integer -- number of worker processes. Default: one per CPU
+    Return value: list of the results of the replicas, in the order of seeds.
+    """
+    #A worker runs a single replica and is then replaced by a fresh process,
+    #so that no scheduler, trace or traffic generator state carries over
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+    try:
+        return pool.map(_runReplica, [(simulation, seed) for seed in seeds], 1)
+    finally:
+        pool.close()
+        pool.join()
+
+def _runReplica(job):
+    """Seed the random number generators and run a replica in a worker."""
+    simulation, seed = job
+    RANDOM_SEED(seed)
+    return simulation(seed)
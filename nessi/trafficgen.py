@@ -22,20 +22,45 @@
 
 """Implementation of different traffic generators."""
 
+from __future__ import print_function
+
 __all__ = ["TrafficSource", "CBRSource", "PoissonSource", "WebSource", "Sink"]
 
+import array
 import struct
-from sys import maxint
 import random
+from types import MethodType
+import numpy
 from simulator import TIME, SCHEDULEABS, SCHEDULE
 from netbase import HigherLayerProtocol, ProtocolEntity
 
 
+_RNG_BATCH = 4096
+"""Number of random variates drawn at once by the numpy based generators."""
+
+_PAGE_SIZE_TRIES = 100
+"""Maximum number of draws of a WebSource page size within its bounds."""
+
+_HDR = struct.Struct("=ii")
+"""Header of generated PDUs: source id and PDU sequence number."""
+
+_MAXSEQ = 0x7FFFFFFF
+"""Largest PDU sequence number. Fits the signed 32-bit header field."""
+
+_PAD = b"x"*(1<<16)
+"""Padding used to fill generated PDUs. Grown when a longer PDU is needed."""
+
+
 class TrafficSource(HigherLayerProtocol):
     """Base class for traffic generators."""
 
     _uniquePDUId = 0
     """Used to generate unique bitstreams."""
+    _nextSrcIdx = 0
+    """Index given to the next source which generates a bitstream."""
+    _srcIdx = None
+    """Small integer identifying the source in its bitstreams.
+    Assigned by _newSrcIdx when the first bitstream is generated."""
     _host = None
     """Host on which the source is installed."""
     
@@ -83,14 +108,35 @@ class TrafficSource(HigherLayerProtocol):
         """Send the generated bitstream to the lower layer."""
         self._lowerLayers.send(bitstream)
 
+    def _newSrcIdx(self):
+        """Give the source its index, unique among the sources of the process.
+
+        Return value: the index of the source.
+        """
+        srcIdx = self._srcIdx = TrafficSource._nextSrcIdx
+        TrafficSource._nextSrcIdx += 1
+        return srcIdx
+
+    def _nextHeader(self):
+        """Return the header of the next PDU and advance the sequence number.
+
+        Return value: the packed source index and PDU sequence number.
+        """
+        srcIdx = self._srcIdx
+        if srcIdx is None:
+            srcIdx = self._newSrcIdx()
+        pduId = self._uniquePDUId
+        self._uniquePDUId = (pduId + 1) & _MAXSEQ
+        return _HDR.pack(srcIdx, pduId)
+
     def _uniqueBitstream(self, length):
         """Generate a unique bitstream of the given length, in bytes."""
-        bitstream =struct.pack("ii", id(self),self._uniquePDUId)
-        self._uniquePDUId += 1
-        if self._uniquePDUId > maxint:
-            self._uniquePDUId = 0
+        global _PAD
+        bitstream = self._nextHeader()
+        if length > len(_PAD):
+            _PAD = b"x"*length
         lth = len(bitstream)
-        return bitstream + "x"*(length-lth) # Fill with 'xxx...' is needed
+        return bitstream + _PAD[lth:length] # Fill with 'xxx...' is needed
 
     def receive(self, *args):
         """Must not be called by the lower layer."""
@@ -130,11 +176,11 @@ class CBRSource(TrafficSource):
     def start(self, time=0.0):
         SCHEDULEABS(time, self.generate)
 
-    def generate(self):
+    def generate(self, _schedule=SCHEDULE):
         self.send(self._uniqueBitstream(self._pduSize))
         self.octetsTransmitted += self._pduSize
         self.pdusTransmitted += 1
-        SCHEDULE(self._interarrival, self.generate)
+        _schedule(self._interarrival, self.generate)
 
 
 class PoissonSource(TrafficSource):
@@ -150,8 +196,10 @@ class PoissonSource(TrafficSource):
           meanInterarrival:Float -- Mean time between PDUs, in seconds.
         Return value: None.
         """
-        self._pduSizeRNG = lambda : random.expovariate(1.0/meanPDUSize)
-        self._interarrivalRNG = lambda : random.expovariate(1.0/meanInterarrival)
+        self._meanPDU = meanPDUSize
+        self._meanIAT = meanInterarrival
+        self._sizeBuf = []
+        self._iatBuf = []
 
         ### Statistics
         self.octetsTransmitted = 0
@@ -161,21 +209,47 @@ class PoissonSource(TrafficSource):
 
     def setPDUSize(self, meanPDUSize):
         """Change the mean size of the generated PDUs, measured in bytes."""
-        self._pduSizeRNG = lambda : random.expovariate(1.0/meanPDUSize)
+        self._meanPDU = meanPDUSize
+        self._sizeBuf = []
 
     def setInterarrival(self, meanInterarrival):
         """Set the mean time between consecutive PDUs, measured in seconds."""
-        self._interarrivalRNG = lambda : random.expovariate(1.0/meanInterarrival)
+        self._meanIAT = meanInterarrival
+        self._iatBuf = []
+
+    def _nextPDUSize(self):
+        """Return the next PDU size, in bytes.
+
+        The sizes are drawn by numpy in batches of _RNG_BATCH values from
+        an exponential distribution, truncated to integers and raised to
+        at least 9 bytes.
+        """
+        buf = self._sizeBuf
+        if not buf:
+            sizes = numpy.random.exponential(self._meanPDU, _RNG_BATCH)
+            buf = self._sizeBuf = numpy.maximum(sizes.astype(int), 9).tolist()
+        return buf.pop()
+
+    def _nextIAT(self):
+        """Return the next exponentially distributed interarrival time.
+
+        The interarrivals are drawn by numpy in batches of _RNG_BATCH values.
+        """
+        buf = self._iatBuf
+        if not buf:
+            buf = self._iatBuf = numpy.random.exponential(
+                self._meanIAT, _RNG_BATCH).tolist()
+        return buf.pop()
 
     def start(self, time=0.0):
-        SCHEDULEABS(time+self._interarrivalRNG(), self.generate)
+        SCHEDULEABS(time+self._nextIAT(), self.generate)
 
-    def generate(self):
-        length = max(9,int(self._pduSizeRNG()))
+    def generate(self, _schedule=SCHEDULE):
+        length = self._nextPDUSize()
         self.send(self._uniqueBitstream(length))
         self.octetsTransmitted += length
         self.pdusTransmitted += 1
-        SCHEDULE(self._interarrivalRNG(), self.generate)
+        _schedule(self._nextIAT(), self.generate)
 
 
 class WebSource(TrafficSource):
@@ -198,6 +272,11 @@ class WebSource(TrafficSource):
       Performance of Web-browsing and Interactive Data in HFC Cable Access
       Networks'. @@@@ where published?
     """
+
+    _onRate = 1e6
+    """Transmission rate during the ON phase, in bit/s."""
+    _pduSize = 512
+    """Size of the PDUs sent during the ON phase, in bytes."""
     
     def __init__(self):
         """Initialize the traffic generator with the default parameters.
@@ -227,7 +306,8 @@ class WebSource(TrafficSource):
           maxSize:Integer -- Maximum page size in bytes.
         Return value: None.
         """
-        self._pageSizeRNG = lambda : random.lognormvariate(mean, stdev)
+        self._pageSizeMu = mean
+        self._pageSizeSigma = stdev
         self._pageSizeMin = minSize
         self._pageSizeMax = maxSize
 
@@ -241,51 +321,106 @@ class WebSource(TrafficSource):
           maxTime:Float -- Maximum OFF time, in seconds.
         Return value: None.
         """
-        # Attention: python random uses scale==1, simply multiply with scale
-        self._offTimeRNG = lambda : random.paretovariate(shape)*scale
+        # The OFF time is drawn by inverting the CDF of the Pareto
+        # distribution conditioned on [minTime, maxTime]. Below the scale
+        # the density is zero, so the effective lower bound is the larger
+        # of the two.
+        minTime = max(minTime, scale)
         self._offTimeMin = minTime
-        self._offTimeMax = maxTime
+        self._offTimeExp = -1.0/shape
+        self._offTimeRange = 1.0 - (float(minTime)/maxTime)**shape
 
     def setOnRate(self, rate=1e6):
         """Set the transmission rate during the ON phase in bit/s."""
         self._onRate = rate
+        self._packetDelay = (self._pduSize*8.0) / rate
 
     def setPDUSize(self, size=512):
         """Set the size of each PDU during the ON phase, in bytes."""
         self._pduSize = size
+        self._packetDelay = (size*8.0) / self._onRate
+
+    def freeze(self):
+        """Specialize generate and _sendPacket for the current parameters.
+
+        The source code of the two methods is generated with the OFF time
+        constants, the PDU size and the packet delay written as literals,
+        and the methods are bound to self. Parameters changed afterwards
+        are ignored until freeze is called again.
+
+        Return value: None.
+        """
+        source = """
+def generate(self, _schedule=SCHEDULE, _random=random.random):
+    offTime = %r * (1.0 - _random()*%r)**%r
+    _schedule(offTime, self._sendPage)
+
+def _sendPacket(self, _schedule=SCHEDULE):
+    pageSize = self._pageSize
+    length = min(pageSize, %d)
+    self.send(self._uniqueBitstream(length))
+    self.octetsTransmitted += length
+    self.pdusTransmitted += 1
+
+    pageSize -= length
+    self._pageSize = pageSize
+    if pageSize > 0:
+        _schedule(%r, self._sendPacket)
+    else:
+        self.pagesTransmitted += 1
+        self.generate()
+""" % (self._offTimeMin, self._offTimeRange, self._offTimeExp,
+       self._pduSize, self._packetDelay)
+
+        namespace = {"SCHEDULE": SCHEDULE, "random": random}
+        exec(source, namespace)
+        self.generate = MethodType(namespace["generate"], self)
+        self._sendPacket = MethodType(namespace["_sendPacket"], self)
 
     def start(self, time=0.0):
         SCHEDULEABS(time, self.generate)
 
-    def generate(self):
+    def generate(self, _schedule=SCHEDULE):
         """Schedule a new page transmission after a random OFF time."""
-        offTime = self._offTimeRNG()
-        offTime = min(offTime, self._offTimeMax)
-        offTime = max(offTime, self._offTimeMin)
-        SCHEDULE(offTime, self._sendPage)
+        u = random.random()
+        offTime = self._offTimeMin * (1.0 - u*self._offTimeRange)**self._offTimeExp
+        _schedule(offTime, self._sendPage)
 
     def _sendPage(self):
-        """Determine a random page size and start sending it."""
-        pageSize = int(self._pageSizeRNG())
-        pageSize = min(pageSize, self._pageSizeMax)
-        pageSize = max(pageSize, self._pageSizeMin)
-        self._pageSize = pageSize
+        """Determine a random page size and start sending it.
+
+        Sizes outside [minSize, maxSize] are drawn again. If none falls
+        into the interval after _PAGE_SIZE_TRIES draws, the last one is
+        clamped.
+        """
+        lognorm = random.lognormvariate
+        mu = self._pageSizeMu
+        sigma = self._pageSizeSigma
+        lo = self._pageSizeMin
+        hi = self._pageSizeMax
+        for i in range(_PAGE_SIZE_TRIES):
+            pageSize = lognorm(mu, sigma)
+            if lo <= pageSize <= hi:
+                break
+        else:
+            pageSize = min(max(pageSize, lo), hi)
+        self._pageSize = int(pageSize)
         self._sendPacket()
 
-    def _sendPacket(self):
+    def _sendPacket(self, _schedule=SCHEDULE):
         """Send PDUs to the lower layer until the whole page is transmitted.
 
         At the end, start a new OFF period by calling generate."""
-        length = min(self._pageSize, self._pduSize)
-        bitstream = self._uniqueBitstream(length)
-        self.send(bitstream)
+        pageSize = self._pageSize
+        length = min(pageSize, self._pduSize)
+        self.send(self._uniqueBitstream(length))
         self.octetsTransmitted += length
         self.pdusTransmitted += 1
 
-        self._pageSize -= length
-        if self._pageSize > 0:
-            delay = (self._pduSize*8.0) / self._onRate
-            SCHEDULE(delay, self._sendPacket)
+        pageSize -= length
+        self._pageSize = pageSize
+        if pageSize > 0:
+            _schedule(self._packetDelay, self._sendPacket)
         else:
             self.pagesTransmitted += 1
             self.generate()
@@ -304,7 +439,7 @@ class DLFlooder(TrafficSource):
           pduSize:Integer -- Length of the generated PDUs, in bytes.
         Return value: None.
         """
-        self._pduSize = pduSize
+        self.setPDUSize(pduSize)
 
         ### Statistics
         self.octetsTransmitted = 0
@@ -315,14 +450,24 @@ class DLFlooder(TrafficSource):
     def setPDUSize(self, pduSize):
         """Change the size of the generated PDUs, measured in bytes."""
         self._pduSize = pduSize
+        self._padCache = b"x"*(pduSize-_HDR.size)
     
     def generate(self):
-        """Generate a new packet and send it to the DL."""
-        assert(self._lowerLayers._device.XOFF == False)
+        """Generate a new packet and send it to the DL.
 
-        while self._lowerLayers._device.XOFF == False:
-            self.send(self._uniqueBitstream(self._pduSize))
-            self.octetsTransmitted += self._pduSize
+        Builds the bitstreams with the header of _uniqueBitstream, but
+        appends the padding cached by setPDUSize.
+        """
+        device = self._lowerLayers._device
+        assert(device.XOFF == False)
+
+        send = self.send
+        nextHeader = self._nextHeader
+        pad = self._padCache
+        pduSize = self._pduSize
+        while not device.XOFF:
+            send(nextHeader() + pad)
+            self.octetsTransmitted += pduSize
             self.pdusTransmitted += 1
 
     def sendStatus(self, status, bitstream):
@@ -338,7 +483,7 @@ class DLFlooder(TrafficSource):
 class TrafficSink(ProtocolEntity):
     """Traffic sink which counts and discards received PDUs."""
     
-    octetsReceived = 0L
+    octetsReceived = 0
     """Count of received octets."""
     pdusReceived = 0
     """Count of received PDUs."""
@@ -364,14 +509,21 @@ class TrafficSink(ProtocolEntity):
         self.pdusReceived += 1
         self.octetsReceived += len(bitstream)
         if self._checkSequence:
-            srcId, pduId = struct.unpack("ii", bitstream[:8])
-            vs = self._VS.get(srcId, -1)
+            srcId, pduId = _HDR.unpack_from(bitstream)
+            if not 0 <= srcId < TrafficSource._nextSrcIdx:
+                # Not generated by _uniqueBitstream: no source has this index
+                print("Sink: unknown source", srcId, pduId)
+                self.sequenceErrors += 1
+                return
+            VS = self._VS
+            if srcId >= len(VS):
+                VS.extend([-1]*(srcId+1-len(VS)))
+            vs = VS[srcId]
             if vs >= 0:
-                if vs + 1 != pduId:
-                    if (vs+1) % maxint != pduId:
-                        print "Sink: sequence error", vs, pduId
-                        self.sequenceErrors += 1
-            self._VS[srcId] = pduId
+                if (vs + 1) & _MAXSEQ != pduId:
+                    print("Sink: sequence error", vs, pduId)
+                    self.sequenceErrors += 1
+            VS[srcId] = pduId
 
     def send(self, *args):
         """Must not be called for a sink."""
@@ -385,5 +537,5 @@ class TrafficSink(ProtocolEntity):
         """
         if activate:
             self.sequenceErrors = 0
-            self._VS = {}
+            self._VS = array.array("i")
         self._checkSequence = activate
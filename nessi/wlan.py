@@ -29,12 +29,20 @@ The module exports the following classes:
     - MAC: Medium Access Control sublayer for the 802.11e protocol.
     - LLC: Link Layer Control sublayer according to 802.2, type 1.
     - PseudoNW: Simule a simple Network layer with a MTU = 1500 octets.
+
+Set the module variable DEBUG to True to print a trace of the MAC activities.
 """
 
 __all__ = ["PHY", "MAC", "LLC", "PseudoNW"]
 
 from random import random, randint
-from zlib import crc32
+import struct
+import numpy
+try:
+    # SIMD accelerated CRC-32, if available
+    from pycrc32 import crc32 as _crc32
+except ImportError:
+    from zlib import crc32 as _crc32
 from netbase import ProtocolEntity, NIU, Device
 from netbase import PhyLayer, DLBottom, DLTop
 from devices import NIC, AP, QAP, WNIC, QWNIC
@@ -43,6 +51,35 @@ from wlanDef import *
 
 from simulator import SCHEDULE, SCHEDULEABS, CANCEL, TIME, ACTIVITY_INDICATION, TRACE
 
+DEBUG = False
+"""Print a trace of the MAC activities on the standard output if True"""
+
+_RATE_MOD = {1e6: "FHSS", 2e6: "FHSS",
+             5.5e6: "DSSS", 11e6: "DSSS",
+             6e6: "OFDM", 9e6: "OFDM", 12e6: "OFDM", 18e6: "OFDM",
+             24e6: "OFDM", 36e6: "OFDM", 48e6: "OFDM", 54e6: "OFDM"}
+"""Name of the PhyModulation method setting the PHY constants of each data rate"""
+
+_PRIO_TO_AC = ("AC_BE", "AC_BK", "AC_BK", "AC_VI", "AC_VI", "AC_VI", "AC_VO", "AC_VO")
+"""Access category of each user priority (0-7)"""
+
+_EDCA_ACS = ("AC_VO", "AC_VI", "AC_BE", "AC_BK")
+"""Access categories of EDCA, from the highest to the lowest priority"""
+
+_AC_TO_QIDX = {"AC_BE": 0, "AC_BK": 1, "AC_VI": 2, "AC_VO": 3}
+"""Index of each access category in the queue sizes of the HC"""
+
+_FCS = struct.Struct(">I")
+"""Format of the FCS at the end of a frame"""
+
+_POW2_MINUS1 = tuple([(1<<i)-1 for i in range(17)])
+"""Contention window 2**ECW-1 of each ECW exponent (0-16)"""
+
+_state = MacState()
+_SEND_STATES = ((1 << _state.SEND_DATA) | (1 << _state.SEND_ACK) | (1 << _state.SEND_BEACON)
+                | (1 << _state.SEND_CFPOLL) | (1 << _state.SEND_CFEND))
+"""Bit mask of the MAC states in which a frame is waiting for the channel"""
+del _state
 
 
 class PHY(PhyLayer):
@@ -87,7 +124,9 @@ class PHY(PhyLayer):
         - carrierSense :  True, if the medium is occupied, False otherwise.
         - send :          Called by the MAC layer to transmit a PPDU.
         - getSlotTime:    Return the Slot Time of PHY layer to compute times variables in MAC sublayer level.
-        - getCW:          Provide the CWmin and CWmax.
+        - getCWmin:       Provide the CWmin.
+        - getCWmax:       Provide the CWmax.
+        - getCW:          Provide the CWmin or CWmax selected by a string.
         - computeIFS:     Compute the four IFS for the MAC sublayer.
         - getTimeLastReceiveActivity: Return the time when the last receive activity has begun.
         - getTransmissionTime: Return the time than take the transmission of x bits
@@ -118,6 +157,10 @@ class PHY(PhyLayer):
         """Start time of the outgoing transmission. Type:Float."""
         self._transmittedData = None
         """Bitstream that has to be send onto the medium. Type:Bitstream."""
+        self._ifsCache = {}
+        """IFS tuples of the current modulation, by AIFSN. Type:Dictionary."""
+        self._phyOverhead = self._mod.preambleLength + self._mod.plcpHeaderLength
+        """Duration of the PHY preamble and PLCP header. Type:Float."""
         
         # Statistics variable
         self.nbCollision = 0
@@ -139,26 +182,18 @@ class PHY(PhyLayer):
         @rtype:             None
         @return:            None
         """
-        if dataRate in (1e6, 2e6, 5.5e6, 6e6, 9e6, 11e6, 12e6, 18e6, 24e6, 36e6, 48e6, 54e6):
-            self._dataRate = dataRate
-        else:
-            raise ValueError("Invalid data rate on Wlan 802.11 NIU "
-                             + self._niu._node.hostname + "."
-                             + self._niu.devicename
-                             + ".phy: " + `dataRate`)
+        modulation = _RATE_MOD.get(dataRate)
+        if modulation is None:
+            raise ValueError(self._err("Invalid data rate on Wlan 802.11 NIU",
+                                       repr(dataRate)))
+        self._dataRate = dataRate
 
-        #Update the PHY constants
-        if dataRate in (1e6, 2e6):
-            #FHSS constants
-            self._mod.FHSS()
-        
-        elif dataRate in (5.5e6, 11e6):
-            #DSSS constants
-            self._mod.DSSS()
-        
-        else:
-            #OFDM shorts constants
-            self._mod.OFDM()
+        #Update the PHY constants (FHSS, DSSS or OFDM shorts constants)
+        getattr(self._mod, modulation)()
+
+        #The IFS and the PHY header duration depend on the PHY constants
+        self._ifsCache.clear()
+        self._phyOverhead = self._mod.preambleLength + self._mod.plcpHeaderLength
         
 
 
@@ -186,6 +221,24 @@ class PHY(PhyLayer):
         
         
         
+    def _err(self, prefix, suffix):
+        """
+        Build an error message naming this PHY.
+        
+        @type prefix:       String
+        @param prefix:      Text placed before the name of the PHY.
+        @type suffix:       String
+        @param suffix:      Text placed after the name of the PHY.
+        
+        @rtype:             String
+        @return:            The error message.
+        """
+        
+        return "%s %s.%s.phy: %s" % (prefix, self._niu._node.hostname,
+                                     self._niu.devicename, suffix)
+        
+        
+        
     def getTransmissionTime(self, dataLength):
         """
         Return the time used for a x bits transmission.
@@ -197,7 +250,7 @@ class PHY(PhyLayer):
         @return:                The time than take the transmission with the current bitrate.
         """
         
-        return self._mod.preambleLength + self._mod.plcpHeaderLength + dataLength*8 / self._dataRate
+        return self._phyOverhead + dataLength*8 / self._dataRate
 
         
         
@@ -223,13 +276,31 @@ class PHY(PhyLayer):
         """
 
         if (minOrMax == 'min'):
-            return self._mod.cwMin
+            return self.getCWmin()
         elif (minOrMax == 'max'):
-            return self._mod.cwMax
+            return self.getCWmax()
         else:
             raise ValueError("Invalid paramater for the PHY Method: cw(minOrMax)")
         
         
+    def getCWmin(self):
+        """
+        @rtype:     Integer
+        @return:    The CWmin of the current modulation.
+        """
+
+        return self._mod.cwMin
+        
+        
+    def getCWmax(self):
+        """
+        @rtype:     Integer
+        @return:    The CWmax of the current modulation.
+        """
+
+        return self._mod.cwMax
+        
+        
     def newChannelActivity(self):
         """
         Register a new channel activity and collisions transmissions.
@@ -294,18 +365,18 @@ class PHY(PhyLayer):
 
                              
         #Reception is finished. Pass received data to the MAC.                              
-        bytelen=int(((TIME()-self._receiveStartTime-self._mod.preambleLength-self._mod.plcpHeaderLength)*self._dataRate + 0.05)/ 8)
+        bytelen=int(((TIME()-self._receiveStartTime-self._phyOverhead)*self._dataRate + 0.05) * 0.125)
         
         if len(bitstream) != bytelen:
-            raise ValueError("Speed mismatch on radio channel "
-                             + self._niu._node.hostname + "."
-                             + self._niu.devicename
-                             + ".phy: received data with invalid length")
+            raise ValueError(self._err("Speed mismatch on radio channel",
+                                       "received data with invalid length"))
                              
         self._niu.mac.receive(bitstream)
 
-        #If channel is now idle, inform the MAC
-        if not self.carrierSense():
+        #If channel is now idle, inform the MAC. The reception that just ended
+        #started more than a SlotTime ago, so the CCA grace period of
+        #carrierSense() does not apply here.
+        if self._receiveActivities == 0 and self._transmittedData is None:
             self._niu.mac.channelIdle()
 
 
@@ -322,14 +393,12 @@ class PHY(PhyLayer):
         """
         
         #The MAC sublayer must have still the right to make a transmission during
-        #one SlotTime (Backoff unit). It's guarantee an eventual transmission collision.
-        if self._receiveStartTime:
-            if TIME()-self._receiveStartTime < self._mod.slotTime:
-                #Autorize MAC sublayer to send. Last receive activities is too recent.
-                #It's permit to guarantee an eventual collision.
-                return False
-
-        return ((self._receiveActivities > 0) or self._transmittedData)
+        #one SlotTime (Backoff unit). It's guarantee an eventual transmission collision:
+        #a receive activity started less than a SlotTime ago is not reported.
+        receiveStartTime = self._receiveStartTime
+        return ((self._receiveActivities > 0 or self._transmittedData is not None)
+                and not (receiveStartTime
+                         and TIME()-receiveStartTime < self._mod.slotTime))
 
 
 
@@ -383,7 +452,7 @@ class PHY(PhyLayer):
         """
 
         # Terminate the transmission (Send the data to the medium and clean up)
-        bytelen=int(((TIME()-self._transmitStartTime-self._mod.preambleLength-self._mod.plcpHeaderLength)*self._dataRate + 0.05)/8)
+        bytelen=int(((TIME()-self._transmitStartTime-self._phyOverhead)*self._dataRate + 0.05) * 0.125)
         bitstream = self._transmittedData[0:bytelen]
         
         self._niu.medium.completeTransmission(self._niu, bitstream)
@@ -395,8 +464,11 @@ class PHY(PhyLayer):
         #The parameters in not used
         self._niu.mac.sendStatus(0, None)
         
-        #If channel is now idle, inform the MAC
-        if not self.carrierSense():
+        #If channel is now idle, inform the MAC (same test as carrierSense():
+        #a receive activity started less than a SlotTime ago is not reported)
+        if ((self._receiveActivities == 0 and self._transmittedData is None)
+            or (self._receiveStartTime
+                and TIME()-self._receiveStartTime < self._mod.slotTime)):
             self._niu.mac.channelIdle()
             
 
@@ -417,6 +489,11 @@ class PHY(PhyLayer):
         @return:    sifs, pifs, aifs (or difs), eifs in a tuple
         """
         
+        #The IFS are computed once per AIFSN until the data rate changes
+        ifs = self._ifsCache.get(AIFSN)
+        if ifs is not None:
+            return ifs
+        
         sifs = self._mod.sifsTime
         """Short Interframe Space. Definition: 9.2.10"""
         pifs = self._mod.sifsTime + self._mod.slotTime
@@ -429,7 +506,8 @@ class PHY(PhyLayer):
         """Extended Interframe Space (396us for FHSS / 364us for DSSS). 
         112us = 8*ACKSIZE(14 octets)/1Mbps (lowest rate). Definition: 9.2.10"""
     
-        return (sifs, pifs, aifs, eifs)
+        ifs = self._ifsCache[AIFSN] = (sifs, pifs, aifs, eifs)
+        return ifs
     
 
         
@@ -564,6 +642,7 @@ class MAC(DLBottom):
         - _receiveQosCfPoll:Reception of a QoS CF-Poll frame.
         - _receiveCfEnd:    Reception of an CF-End frame by a QSTA.
         - _receiveBeacon:   Reception of a Beacon frame.
+        - _receiveUnknown:  Reception of a frame of an unknown type.
         
         
     CONTROL METHODS:
@@ -619,6 +698,8 @@ class MAC(DLBottom):
     """TU is the official time unit for use in the MAC frame"""
     _MIN_UNIT = 1e-6 #seconds
     """1e-6 is the min time unit use in 802.11. Use often to round up a time. """
+    _BACKOFF_BATCH = 1024
+    """Number of random backoffs drawn at once for a contention window."""
     
         
     
@@ -632,6 +713,23 @@ class MAC(DLBottom):
         self._frameSubType = MacFrameSubType()
         self._state = MacState()
         self._status = MacStatus()
+        
+        #Handlers of the received frames
+        self._rxDispatch = {
+            (self._frameType.DATA<<4) | self._frameSubType.DATA: self._receiveData,
+            (self._frameType.CONTROL<<4) | self._frameSubType.ACK: self._receiveAck,
+            (self._frameType.DATA<<4) | self._frameSubType.QOSCF_POLL: self._receiveQosCfPoll,
+            (self._frameType.CONTROL<<4) | self._frameSubType.CF_END: self._receiveCfEnd,
+            (self._frameType.MANAGEMENT<<4) | self._frameSubType.BEACON: self._receiveBeacon}
+        """Reception method of each frame, by (type<<4 | subType) of the frame control"""
+        
+        #Activity indications of the sent frames (except Data, which depends on retries)
+        self._txIndication = {
+            self._state.SEND_ACK: (("ack", "blue", 3, 2), "Send Ack"),
+            self._state.SEND_BEACON: (("darkblue", "", 3, 2), "Send Beacon"),
+            self._state.SEND_CFPOLL: (("darkblue", "", 3, 2), "Send QoS CF-Poll"),
+            self._state.SEND_CFEND: (("darkblue", "", 3, 2), "Send QoS CF-End")}
+        """Activity indication arguments and trace text of each send state"""
 
         
         #Private fields - General
@@ -643,6 +741,8 @@ class MAC(DLBottom):
         """Actual state of the MAC layer."""
         self._sendBuffer = None
         """Contains the current frame to send."""
+        self._serializedBuffer = (None, None)
+        """The last serialized send buffer and its bitstream (frame, bitstream)."""
         self._macSave = {"lastMacState": self._state.IDLE,
                              "lastSendBuffer": None}
         """Save of main variable of the last state of the MAC sublayer. Dictionnary."""
@@ -676,6 +776,8 @@ class MAC(DLBottom):
         """Indicate if a Backoff must be applicate for the next transmission."""
         self._backoffEventId = None
         """Event id scheduled when the backoff is finished. It's permit to test if we are in phase of a Backing off too."""
+        self._backoffDraws = {}
+        """Random backoffs drawn in advance, by contention window. Dictionnary."""
         
         
         #Private fields - Retransmission procedure
@@ -685,6 +787,8 @@ class MAC(DLBottom):
         """Indicate if the last receive frame was erroneous. During the period that this variable is true, EIFS replace DIFS."""
         self._infoFramesCache = []
         """Cache Information concerned the last frames received. Definition: 9.2.9"""
+        self._ackFCSCache = {}
+        """FCS of the ACK frame sent to each receiver address. The other ACK fields are constant."""
         self._ackTimeout = 10 #[TU]
         """Unit Time waited by the source STA before make the retransmission of data frame.
            The standard 802.11 don't specify this value."""
@@ -776,6 +880,16 @@ class MAC(DLBottom):
             self._niu = niu
         else:
             raise TypeError("802.11 MAC sublayer must be installed on a NIU (AP, QAP, WNIC or QWNIC)")
+        
+        #Role of the device
+        self._isAP = niu.__class__ is AP or niu.__class__ is QAP
+        """True for (Q)APs"""
+        self._isQoS = niu.__class__ is QAP or niu.__class__ is QWNIC
+        """True for QoS devices (QAP and QWNIC)"""
+        self._isQAP = niu.__class__ is QAP
+        """True for QAPs"""
+        self._isQSTA = niu.__class__ is QWNIC
+        """True for QoS stations (QWNIC)"""
             
         if protocolName != "mac":
             raise NameError("802.11 MAC sublayer must be installed under the "
@@ -791,16 +905,16 @@ class MAC(DLBottom):
         
         #Set the (Q)AP MAC address (48 bits)
         #For (Q)APs the MAC address is a fixed value (in wlanDef.py)
-        if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+        if self._isAP:
             self._mib.address = self._bib.apAddr
        
         
         #Private fields - EDCA & DCF Backoff Entities
         #Obtain PHY informations
-        cwMin = self._niu.phy.getCW('min')
-        cwMax = self._niu.phy.getCW('max')
+        cwMin = self._niu.phy.getCWmin()
+        cwMax = self._niu.phy.getCWmax()
         dataRate = self._niu.phy.getDataRate
-        if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
+        if self._isQoS:
             #Private fields - EDCA
             self.AC_BK = BackoffEntity("AC_BK", cwMin, cwMax, dataRate)
             self.AC_BE = BackoffEntity("AC_BE", cwMin, cwMax, dataRate)
@@ -808,9 +922,13 @@ class MAC(DLBottom):
             self.AC_VO = BackoffEntity("AC_VO", cwMin, cwMax, dataRate)
             self._edcaParamUpdateCTR = 0
             """Count the number of time than EDCA Parameter are updated"""
+            self._acMap = {"AC_BK": self.AC_BK, "AC_BE": self.AC_BE,
+                           "AC_VI": self.AC_VI, "AC_VO": self.AC_VO}
+            """Backoff entities by access category name"""
         else:
             #Private fields - DCF
             self.DCF = BackoffEntity("DCF", cwMin, cwMax, dataRate)
+            self._acMap = {"DCF": self.DCF}
             
         
         #Structure of MAC frame fields
@@ -818,7 +936,7 @@ class MAC(DLBottom):
         
         
         #Structures QoS / non-QoS
-        if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
+        if self._isQoS:
             #With QoS Control field
             self.MPDUFormat = self.format.MPDUQos
             self.BeaconDataFormat = self.format.BeaconDataQos
@@ -830,12 +948,12 @@ class MAC(DLBottom):
         
         
         #Start Beacon Management for AP
-        if self._niu.__class__ == AP or self._niu.__class__ == QAP:
+        if self._isAP:
             self._startBeacon()
         
         
         #Init HC
-        if self._niu.__class__ == QAP:
+        if self._isQAP:
             self._hc.queueSize[self._bib.apAddr] = [0, 0, 0, 0]
         
         
@@ -885,11 +1003,11 @@ class MAC(DLBottom):
         else:
             self._niu.phy.setDataRate(dataRate)
             
-        if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
+        if self._isQoS:
             if (dataRate != 1):
                 #Obtain PHY info
-                cwMin = self._niu.phy.getCW('min')
-                cwMax = self._niu.phy.getCW('max')
+                cwMin = self._niu.phy.getCWmin()
+                cwMax = self._niu.phy.getCWmax()
                 dataRate = self._niu.phy.getDataRate
                 #Adapt the new DataRate with the 4 EDCAs Tables by default PHY Values
                 self.AC_BE.resetEDCATable("AC_BK", cwMin, cwMax, dataRate)
@@ -942,7 +1060,7 @@ class MAC(DLBottom):
     
     
     
-    def configEDCATable(index, ecwMin=5, ecwMax=10, aifsn=7, txopLimit=0, msduLifeTime=500):
+    def configEDCATable(self, index, ecwMin=5, ecwMax=10, aifsn=7, txopLimit=0, msduLifeTime=500):
         """
         Configure the EDCA Table. This Table must be configure after the method config
         because this method config initialize the EDCA tables with the default PHY values.
@@ -971,14 +1089,14 @@ class MAC(DLBottom):
         """
         
         #ECWmin
-        if ((cwMin<0) or (cwMin>255)):
-            print("Error Config: ECWmin must be between 0 and 8 TU. We take the Default value: 5")
-            cwMin=5
+        if ((ecwMin<0) or (ecwMin>8) or (ecwMin!=int(ecwMin))):
+            print("Error Config: ECWmin must be an integer between 0 and 8 TU. We take the Default value: 5")
+            ecwMin=5
         
         #ECWmax
-        if ((cwMax<0) or (cwMin>65535)):
-            print("Error Config: ECWmax must be between 0 and 16 TU. We take the Default value: 10")
-            cwMax=10
+        if ((ecwMax<0) or (ecwMax>16) or (ecwMax!=int(ecwMax))):
+            print("Error Config: ECWmax must be an integer between 0 and 16 TU. We take the Default value: 10")
+            ecwMax=10
         
         #AIFSN
         if ((aifsn<2) or (aifsn>15)):
@@ -999,35 +1117,21 @@ class MAC(DLBottom):
         self._edcaParamUpdateCTR += 1
     
         if index == 1: #AC_BK
-            self.AC_BK.EDCATable.CWmin = 2**ecwMin-1
-            self.AC_BK.EDCATable.CWmax = 2**ecwMax-1
-            self.AC_BK.EDCATable.AIFSN = aifsn
-            self.AC_BK.EDCATable.TXOPLimit = txopLimit
-            self.AC_BK.EDCATable.MSDULifeTime = msduLifeTime
-       
-        elif index == 2: #AC_BE      
-            self.AC_BE.EDCATable.CWmin = 2**ecwMin-1
-            self.AC_BE.EDCATable.CWmax = 2**ecwMax-1
-            self.AC_BE.EDCATable.AIFSN = aifsn
-            self.AC_BE.EDCATable.TXOPLimit = txopLimit
-            self.AC_BE.EDCATable.MSDULifeTime = msduLifeTime
-
+            table = self.AC_BK.EDCATable
+        elif index == 2: #AC_BE
+            table = self.AC_BE.EDCATable
         elif index == 3: #AC_VI
-            self.AC_VI.EDCATable.CWmin = 2**ecwMin-1
-            self.AC_VI.EDCATable.CWmax = 2**ecwMax-1
-            self.AC_VI.EDCATable.AIFSN = aifsn
-            self.AC_VI.EDCATable.TXOPLimit = txopLimit
-            self.AC_VI.EDCATable.MSDULifeTime = msduLifeTime
-
+            table = self.AC_VI.EDCATable
         elif index == 4: #AC_VO
-            self.AC_VO.EDCATable.CWmin = 2**ecwMin-1
-            self.AC_VO.EDCATable.CWmax = 2**ecwMax-1
-            self.AC_VO.EDCATable.AIFSN = aifsn
-            self.AC_VO.EDCATable.TXOPLimit = txopLimit
-            self.AC_VO.EDCATable.MSDULifeTime = msduLifeTime
-
+            table = self.AC_VO.EDCATable
         else:
             raise ValueError("Index Error for EDCATable.")
+            
+        table.CWmin = _POW2_MINUS1[int(ecwMin)]
+        table.CWmax = _POW2_MINUS1[int(ecwMax)]
+        table.AIFSN = aifsn
+        table.TXOPLimit = txopLimit
+        table.MSDULifeTime = msduLifeTime
         
         
         
@@ -1086,7 +1190,7 @@ class MAC(DLBottom):
 
         #Address management
         #For (Q)AP
-        if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+        if self._isAP:
         
             address1 = destMACAddr          #TX address
             address2 = self._bib.bssId      #RX address
@@ -1105,25 +1209,14 @@ class MAC(DLBottom):
             
             
         #For QoS devices --> EDCA
-        if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
+        if self._isQoS:
             #Determine AC for this current MSDU
             if self._mode == "DCF":
                 accessCategory = "DCF"
-            elif priority == 0:
-                accessCategory = "AC_BE"
-            
-            elif priority == 1 or priority == 2:
-                accessCategory = "AC_BK"
-                
-            elif priority == 3 or priority == 4 or priority == 5:
-                accessCategory = "AC_VI"
-                
-            elif priority == 6 or priority == 7:
-                accessCategory = "AC_VO"
-                
             else:
-                #TID
-                None
+                accessCategory = _PRIO_TO_AC[priority]
+            
+            backoffEntity = self._acMap[accessCategory]
             
             #Add the MSDU life time
             #Increment the MSDU ID
@@ -1131,28 +1224,20 @@ class MAC(DLBottom):
 
             #Life time event
             #When the life time is time up (MSDU will be discarded).
-            lifeTimeEvent = SCHEDULE(eval("self." +accessCategory).EDCATable.MSDULifeTime\
+            lifeTimeEvent = SCHEDULE(backoffEntity.EDCATable.MSDULifeTime\
             * self._TIME_UNIT, self._discardMsdu, (self._msduId, accessCategory))
                 
             #Add an list of information in last place in Transmission Queue
-            eval("self." +accessCategory).transmissionQueue.append([self._msduId, msdu, address1, \
-            address2, address3, priority, serviceClass, lifeTimeEvent])
+            backoffEntity.transmissionQueue.append([self._msduId, msdu, address1, \
+            address2, address3, priority, serviceClass, lifeTimeEvent, len(msdu)])
             
-            if self._niu.__class__ == QAP:
+            if self._isQAP:
                 #Update QAP queues informations for the HC
-                if accessCategory == "AC_BE":
-                    index=0
-                elif accessCategory == "AC_BK":
-                    index=1
-                elif accessCategory == "AC_VI":
-                    index=2
-                elif accessCategory == "AC_VO":
-                    index=3
-                    
-                self._hc.queueSize[self._bib.apAddr][index] = len(eval("self." +accessCategory).transmissionQueue)
+                index = _AC_TO_QIDX[accessCategory]
+                self._hc.queueSize[self._bib.apAddr][index] = len(backoffEntity.transmissionQueue)
 
 
-            print "%f : " %TIME() +self._niu._node.hostname +" : New " +accessCategory +" MSDU %i" %self._msduId #debug
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : New " +accessCategory +" MSDU %i" %self._msduId #debug
             
         #For non-QoS devices --> DCF
         else:
@@ -1175,7 +1260,7 @@ class MAC(DLBottom):
         #because the MAC State is never IDLE if there are still MSDU in wait to send.
         #Initiate the transmission procedure with the selection of next MSDU.
         self._txInProgress = True
-        print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (send)" #debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (send)" #debug
         self._selectNextMSDU()
 
 
@@ -1211,22 +1296,25 @@ class MAC(DLBottom):
         @return:            None
         """
 
+        state = self._state
         self._latestTransmitActivity = TIME()
        
         #The last frame sended is a Data frame
-        if (self._macState == self._state.SEND_DATA):
+        if (self._macState == state.SEND_DATA):
             #MAC enter in the mode "wait an ACK"
-            self._macState = self._state.WAIT_ACK
+            self._macState = state.WAIT_ACK
+            
+            backoffEntity = self._acMap[self._backoffEntityTransmit]
             
             #Cancel always the life time event in the first physical transmission
-            lifeTimeEvent = eval("self." +self._backoffEntityTransmit).transmissionQueue[0][7]
+            lifeTimeEvent = backoffEntity.transmissionQueue[0][7]
             if lifeTimeEvent:
                 CANCEL(lifeTimeEvent)
-                eval("self." +self._backoffEntityTransmit).transmissionQueue[0][7] = None
+                backoffEntity.transmissionQueue[0][7] = None
 
             
             #Statistics update about an eventual previous retransmission
-            if eval("self." +self._backoffEntityTransmit).shortRetryCount:
+            if backoffEntity.shortRetryCount:
                 self.stat.framesRetransmitted += 1
                 self.stat.octetsTransmittedError += len(self._sendBuffer.data)
         
@@ -1236,18 +1324,18 @@ class MAC(DLBottom):
 
 
         #The last frame sended is an Ack frame
-        elif (self._macState == self._state.SEND_ACK):
+        elif (self._macState == state.SEND_ACK):
             #Statistics update
             self.stat.ackTransmit += 1
             
-            print "%f : " %TIME() +self._niu._node.hostname +" : RX OFF" #debug
-            print " "
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : RX OFF" #debug
+            if DEBUG: print " "
             
             
             #Test if we are in a NAV period
             if self._navEventId:
                 #Continue the NAV
-                self._macState = self._state.IDLE
+                self._macState = state.IDLE
                 return
                 
                 
@@ -1255,12 +1343,12 @@ class MAC(DLBottom):
             self._restoreMacState()
             
           
-            if self._macState == self._state.SEND_DATA:
+            if self._macState == state.SEND_DATA:
                 #When the Ack frame was sended, there was in a backoff procedure for
                 #the send of a data frame. Continue this last procedure...
                 return #The PHY layer will call the mac.channelAccess()
                 
-            elif self._macState == self._state.WAIT_ACK:
+            elif self._macState == state.WAIT_ACK:
                 #When the Ack frame was sended, there was in wait of a ACK of a previous data frame.
                 if not self._retryEventId:
                     #The retransmission event is raised during the ACK send
@@ -1270,7 +1358,7 @@ class MAC(DLBottom):
                 #Wait the retransmission event
                 return
             
-            elif self._macState == self._state.IDLE:
+            elif self._macState == state.IDLE:
                 #We left the MAC sublayer
                 self._terminMac()
 
@@ -1281,7 +1369,7 @@ class MAC(DLBottom):
             
         
         #The last frame sended is a QoS CF-Poll
-        elif (self._macState == self._state.SEND_CFPOLL):
+        elif (self._macState == state.SEND_CFPOLL):
         
             #Statistics update
             self.stat.cfPollTransmit += 1
@@ -1290,13 +1378,13 @@ class MAC(DLBottom):
             self._poll = False
             
             #We left the MAC sublayer
-            self._macState = self._state.IDLE
+            self._macState = state.IDLE
             self._terminMac()
         
         
 
         #The last frame sended is a Beacon frame
-        elif (self._macState == self._state.SEND_BEACON):
+        elif (self._macState == state.SEND_BEACON):
         
             #Statistics update
             self.stat.beaconTransmit += 1
@@ -1304,12 +1392,12 @@ class MAC(DLBottom):
             #Restore the last State of MAC
             self._restoreMacState()
             
-            if self._macState == self._state.SEND_DATA:
+            if self._macState == state.SEND_DATA:
                 #When the Beacon frame was sended, there was in a send data procedure.
                 #Continue this last procedure.
                 return #The PHY layer will call the mac.channelAccess()
                 
-            elif self._macState == self._state.WAIT_ACK:
+            elif self._macState == state.WAIT_ACK:
                 #When the Beacon frame was sended, there was in wait of a ACK of a previous data frame.
                 if not self._retryEventId:
                     #The retransmission event is raised during the Beacon send
@@ -1319,7 +1407,7 @@ class MAC(DLBottom):
                 #Wait the retransmission event
                 return
             
-            elif self._macState == self._state.IDLE:
+            elif self._macState == state.IDLE:
                 #We left the MAC sublayer
                 self._terminMac()
                 
@@ -1331,13 +1419,13 @@ class MAC(DLBottom):
         
         
         #The last frame sended is a CF-End
-        elif (self._macState == self._state.SEND_CFEND):
+        elif (self._macState == state.SEND_CFEND):
         
             #Statistics update
             self.stat.cfEndTransmit += 1
 
             #We left the MAC sublayer
-            self._macState = self._state.IDLE
+            self._macState = state.IDLE
             self._terminMac()
         
         
@@ -1356,7 +1444,7 @@ class MAC(DLBottom):
             - _receiveAck()
             - _receiveBeacon()
             - _receiveQosCfPoll()
-            - _receiveQosCfEnd()
+            - _receiveCfEnd()
         
         Reception of a data frame:  - Check frame
                                     - Send an ACK
@@ -1390,43 +1478,34 @@ class MAC(DLBottom):
         fc = self.format.FrameControl()
         fc.fill(bitstream[0:1])
 
-        #Data frame receive
-        if (fc.type == self._frameType.DATA) and (fc.subType == self._frameSubType.DATA):
+        #Data, Ack, QoS Cf-Poll, Cf-End or Beacon frame receive
+        handler = self._rxDispatch.get((fc.type<<4) | fc.subType, self._receiveUnknown)
+        handler(bitstream)
 
-            self._receiveData(bitstream)
-        
-        #Ack frame receive
-        elif (fc.type == self._frameType.CONTROL) and (fc.subType == self._frameSubType.ACK):
+
+
+    def _receiveUnknown(self, bitstream):
+        """
+        Reception of a frame of an unknown type.
         
-            self._receiveAck(bitstream)
-            
-        #QoS Cf-Poll frame receive    
-        elif (fc.type == self._frameType.DATA) and (fc.subType == self._frameSubType.QOSCF_POLL):
+        It's also possible there is an error in the frame Control. If the
+        FCS is correct, the frame format is not implemented.
         
-            self._receiveQosCfPoll(bitstream)
-            
-        #Cf-End frame receive
-        elif (fc.type == self._frameType.CONTROL) and (fc.subType == self._frameSubType.CF_END):
+        @type bitstream:    Bitstream (list of char)
+        @param bitstream:   Data received
         
-            self._receiveQosCfEnd(bitstream)
-            
-        #Beacon frame receive
-        elif (fc.type == self._frameType.MANAGEMENT) and (fc.subType == self._frameSubType.BEACON):
+        @rtype:             None
+        @return:            None
+        """
         
-            self._receiveBeacon(bitstream)
-            
-            
-        #Other frame receive
-        else:
-            #It's also possible there is an error in the frame Control.
-            #Control the FCS
-            checksum = crc32(bitstream[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
-            FCS = (ord(bitstream[-4:-3])<<24) + (ord(bitstream[-3:-2])<<16) + (ord(bitstream[-2:-1])<<8) + ord(bitstream[-1:])
-            if (checksum == FCS):
-                raise ValueError(self._niu._node.hostname +": Frame format received is not implemented.")
+        #Control the FCS
+        checksum = _crc32(bitstream[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
+        FCS, = _FCS.unpack_from(bitstream, len(bitstream)-4)
+        if (checksum == FCS):
+            raise ValueError(self._niu._node.hostname +": Frame format received is not implemented.")
 
-            #Statistics updates, impossible to determine frame type due to an error in the header of frame
-            self.stat.unknowReceivedFCSErrors += 1
+        #Statistics updates, impossible to determine frame type due to an error in the header of frame
+        self.stat.unknowReceivedFCSErrors += 1
 
 
             
@@ -1440,28 +1519,29 @@ class MAC(DLBottom):
         @return:    None
         """
         
+        state = self._state
         #If there is a NAV period, no channel access is possible
         if self._navEventId:
-            if self._macState != self._state.SEND_ACK:
-                self._macState = self._state.IDLE
+            if self._macState != state.SEND_ACK:
+                self._macState = state.IDLE
             return
         
         #Test if a transmission is waiting for idle channel and call it.
-        if self._txInProgress and self._macState == self._state.SEND_DATA and not self._txop and not self._cap:
+        if self._txInProgress and self._macState == state.SEND_DATA and not self._txop and not self._cap:
             self._startProcedureTime = TIME()
             SCHEDULE(0.0, self._channelAccess)
             return
             
         #TXOP polling by the QAP
         if self._mode == "HCCA":
-            if self._niu.__class__ == QAP and (self._poll or self._cfp):
+            if self._isQAP and (self._poll or self._cfp):
                 self._selectSTAPoll()
             
             
         #If the Mac was Idle before the last activity and the transmission queue 
         #is not empty, select the next MSDU to proceed to a new transmission.
-        if (self._macState == self._state.IDLE and self._txContinue()):
-            print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (channelIdle)" #debug
+        if (self._macState == state.IDLE and self._txContinue()):
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (channelIdle)" #debug
             self._txInProgress = True
             SCHEDULE(0.0, self._selectNextMSDU)
 
@@ -1507,51 +1587,54 @@ class MAC(DLBottom):
         @return:    None
         """
         
+        state = self._state
+        phy = self._niu.phy
+        macState = self._macState
+        hostname = self._niu._node.hostname
+
         #Begin the transmit procedure only if the MAC sublayer is in a Send Mode
-        if (self._macState != self._state.SEND_DATA) and (self._macState != self._state.SEND_ACK) \
-        and (self._macState != self._state.SEND_BEACON) and (self._macState != self._state.SEND_CFPOLL) \
-        and (self._macState != self._state.SEND_CFEND):
-            raise ValueError(self._niu._node.hostname +": Want to access to the channel, "
+        if not (1 << macState) & _SEND_STATES:
+            raise ValueError(hostname +": Want to access to the channel, "
             +"but there is no frame to send.")
         
         
         # 1. Carrier Sense (PHY & MAC)
-        #print "%f : " %TIME() +self._niu._node.hostname +" : Want a Channel Access. State: " +str(self._macState) #debug
-        if self._navEventId and self._macState != self._state.SEND_ACK:
+        #print "%f : " %TIME() +hostname +" : Want a Channel Access. State: " +str(macState) #debug
+        if self._navEventId and macState != state.SEND_ACK:
             #If it is a NAV period, no channel access is possible (except for a ACK send)
-            self._macState = self._state.IDLE
+            self._macState = state.IDLE
             #Case of the IFS period end and the channel is NAV
             self._IFSEventId = None
             return
-        if self._niu.phy.carrierSense():
+        if phy.carrierSense():
             #Case of the IFS period finish and the channel is busy
             self._IFSEventId = None
         
             #The channel is busy
-            if self._macState == self._state.SEND_ACK:
-                raise ValueError(self._niu._node.hostname +": The ACK frame could not be sended, "
+            if macState == state.SEND_ACK:
+                raise ValueError(hostname +": The ACK frame could not be sended, "
                 +"the channel is busy.")
 
-            elif self._macState == self._state.SEND_BEACON:
-                raise ValueError(self._niu._node.hostname +": The Beacon frame could not be sended, "
+            elif macState == state.SEND_BEACON:
+                raise ValueError(hostname +": The Beacon frame could not be sended, "
                 +"the channel is busy.")
             
-            elif self._macState == self._state.SEND_DATA:
+            elif macState == state.SEND_DATA:
                 #Wait until channel activities end (a Backoff procedure will be applied). 
                 #The mac.channelIdle method will call by PHY when the channel will be free.
                 self._applyBackoff = True
                 return
                 
-            elif self._macState == self._state.SEND_CFPOLL:
-                raise ValueError(self._niu._node.hostname +": The QoS CF-Poll frame could not be sended, "
+            elif macState == state.SEND_CFPOLL:
+                raise ValueError(hostname +": The QoS CF-Poll frame could not be sended, "
                 +"the channel is busy.")
                 
-            elif self._macState == self._state.SEND_CFEND:
-                raise ValueError(self._niu._node.hostname +": The CF-End frame could not be sended, "
+            elif macState == state.SEND_CFEND:
+                raise ValueError(hostname +": The CF-End frame could not be sended, "
                 +"the channel is busy.")
                 
             else:
-                raise ValueError(self._niu._node.hostname +": Want to access to the channel, " 
+                raise ValueError(hostname +": Want to access to the channel, " 
                 +"but there is no frame to send.")
 
 
@@ -1569,12 +1652,12 @@ class MAC(DLBottom):
     
         # 4. Report the transmission if the next TBTT is encroached by the total procedure of transmission.
         # For DATA frame: DATA + 2xSIFS + ACK. The second SIFS is for the Beacon in TBTT
-        if self._beacon and self._macState == self._state.SEND_DATA:
-            if TIME() + self._niu.phy.getTransmissionTime(len(self._sendBuffer.serialize()))\
-            + self._niu.phy.getTransmissionTime(self._ACKSIZE) + 2*self._niu.phy.computeIFS()[0] > self._targetBeaconTxTime:
+        if self._beacon and macState == state.SEND_DATA:
+            if TIME() + phy.getTransmissionTime(len(self._serializeSendBuffer()))\
+            + phy.getTransmissionTime(self._ACKSIZE) + 2*phy.computeIFS()[0] > self._targetBeaconTxTime:
             
                 if self._txop:
-                    raise ValueError(self._niu._node.hostname +": Want to access to the channel in a TXOP"
+                    raise ValueError(hostname +": Want to access to the channel in a TXOP"
                     +" but TBTT will be encroached (Test must be made in method ReceiveACK)")
 
                 else:
@@ -1584,51 +1667,44 @@ class MAC(DLBottom):
                     self._applyBackoff = True
                     if self._cap:
                         self._cap = False
-                    print "%f : " %TIME() +self._niu._node.hostname +" : The transmission is reported after the reception of beacon."\
+                    if DEBUG: print "%f : " %TIME() +hostname +" : The transmission is reported after the reception of beacon."\
                     +" TBTT: %f (Data transmission)" %self._targetBeaconTxTime#@@debug
 
                     return
                     
         # For QoS CF-Poll frame: CF-POLL + SIFS. 
-        elif self._beacon and self._macState == self._state.SEND_CFPOLL:
-            if TIME() + self._niu.phy.getTransmissionTime(len(self._sendBuffer.serialize()))\
-            + self._niu.phy.computeIFS()[0] > self._targetBeaconTxTime:
+        elif self._beacon and macState == state.SEND_CFPOLL:
+            if TIME() + phy.getTransmissionTime(len(self._serializeSendBuffer()))\
+            + phy.computeIFS()[0] > self._targetBeaconTxTime:
                 #The send of QoS CF-Poll frame is canceled
                 self._poll = False
-                self._macState = self._state.IDLE
+                self._macState = state.IDLE
                 self._terminMac()
                 return
     
     
         # 5. Initiate the transmission
         #@@debug
-        if self._macState == self._state.SEND_DATA:
-            if (eval("self." +self._backoffEntityTransmit).shortRetryCount > 0):
-                print "%f : " %TIME() +self._niu._node.hostname +" : Data Retransmission"
+        if macState == state.SEND_DATA:
+            if (self._acMap[self._backoffEntityTransmit].shortRetryCount > 0):
+                if DEBUG: print "%f : " %TIME() +hostname +" : Data Retransmission"
                 ACTIVITY_INDICATION(self, "tx", "data retransmission", "red", 3, 2)
             else:
-                print "%f : " %TIME() +self._niu._node.hostname +" : Send Data"
+                if DEBUG: print "%f : " %TIME() +hostname +" : Send Data"
                 ACTIVITY_INDICATION(self, "tx", "data", "green", 0, 0)
-        elif self._macState == self._state.SEND_ACK:
-            print "%f : " %TIME() +self._niu._node.hostname +" : Send Ack"
-            ACTIVITY_INDICATION(self, "tx", "ack", "blue", 3, 2)
-        elif self._macState == self._state.SEND_BEACON:
-            print "%f : " %TIME() +self._niu._node.hostname +" : Send Beacon"
-            if self._cfp:
-                print "%f : " %TIME() +self._niu._node.hostname +" : START CFP"
-            ACTIVITY_INDICATION(self, "tx", "darkblue", "", 3, 2)
-        elif self._macState == self._state.SEND_CFPOLL:
-            print "%f : " %TIME() +self._niu._node.hostname +" : Send QoS CF-Poll"
-            ACTIVITY_INDICATION(self, "tx", "darkblue", "", 3, 2)  
-        elif self._macState == self._state.SEND_CFEND:
-            print "%f : " %TIME() +self._niu._node.hostname +" : Send QoS CF-End"
-            print "%f : " %TIME() +self._niu._node.hostname +" : STOP CFP"
-            ACTIVITY_INDICATION(self, "tx", "darkblue", "", 3, 2)
         else:
-            print "%f : " %TIME() +self._niu._node.hostname + " : %i"  %self._macState
+            #The other send states only differ by their indication
+            activity, trace = self._txIndication[macState]
+            if DEBUG:
+                print "%f : " %TIME() +hostname +" : " +trace
+                if macState == state.SEND_BEACON and self._cfp:
+                    print "%f : " %TIME() +hostname +" : START CFP"
+                elif macState == state.SEND_CFEND:
+                    print "%f : " %TIME() +hostname +" : STOP CFP"
+            ACTIVITY_INDICATION(self, "tx", *activity)
         
         self._latestStartTransmitActivity = TIME()
-        self._niu.phy.send(self._sendBuffer.serialize())
+        phy.send(self._serializeSendBuffer())
         
         
         
@@ -1644,27 +1720,30 @@ class MAC(DLBottom):
         
                 
         if self._startProcedureTime == TIME():
+            state = self._state
+            phy = self._niu.phy
+            macState = self._macState
                 
             #Obtain the IFS
-            SIFS, PIFS, DIFS, EIFS = self._niu.phy.computeIFS()
+            SIFS, PIFS, DIFS, EIFS = phy.computeIFS()
             
             #Select the appropriate IFS
-            if (self._macState == self._state.SEND_ACK):
+            if (macState == state.SEND_ACK):
                 IFS = SIFS
                 self._applyBackoff = False #No Backoff is applied
                     
-            elif (self._macState == self._state.SEND_BEACON):
+            elif (macState == state.SEND_BEACON):
                 self._applyBackoff = False #No Backoff is applied
                 #A SIFS Time is already garanted before the send of beacon
                 return False
                 
-            elif (self._macState == self._state.SEND_DATA):
+            elif (macState == state.SEND_DATA):
                 if self._txop or self._cap:
                     IFS = SIFS
                 else:
                     #QoS devices
-                    if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
-                        AIFS = self._niu.phy.computeIFS(eval("self." +self._backoffEntityTransmit).EDCATable.AIFSN)[2]
+                    if self._isQoS:
+                        AIFS = phy.computeIFS(self._acMap[self._backoffEntityTransmit].EDCATable.AIFSN)[2]
                         if self._lastFrameError:
                             IFS = EIFS - DIFS + AIFS #ref: 9.2.3.5
                         else:
@@ -1677,7 +1756,7 @@ class MAC(DLBottom):
                         else:
                             IFS = DIFS
                             
-            elif (self._macState == self._state.SEND_CFPOLL):
+            elif (macState == state.SEND_CFPOLL):
                 IFS = PIFS
                 self._applyBackoff = False #No Backoff is applied
                 
@@ -1692,25 +1771,25 @@ class MAC(DLBottom):
                         raise ValueError(self._niu._node.hostname +": Want to access to the channel in a TXOP"
                         +" but TBTT will be encroached (Test must be made in method ReceiveACK)")
                     else:
-                        if self._macState == self._state.SEND_DATA:
+                        if macState == state.SEND_DATA:
                             #The transmission is reported after the reception of beacon
                             #will be recalled by mac.channelIdle()
                             self._applyBackoff = True
                             if self._cap:
                                 self._cap = False
-                            print "%f : " %TIME() +self._niu._node.hostname +": The transmission is reported after the reception of beacon. TBTT: %f (IFS)"\
+                            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +": The transmission is reported after the reception of beacon. TBTT: %f (IFS)"\
                             %self._targetBeaconTxTime #@@debug
-                        elif self._macState == self._state.SEND_CFPOLL:
+                        elif macState == state.SEND_CFPOLL:
                             #The transmission is canceled
                             self._poll = False
-                            self._macState = self._state.IDLE
+                            self._macState = state.IDLE
                             self._terminMac()
 
                         return True
             
             
             #Wait the IFS
-            print "%f : " %TIME() +self._niu._node.hostname +" : IFS: %f" %IFS #debug
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : IFS: %f" %IFS #debug
             self._IFSEventId = SCHEDULE(IFS, self._channelAccess)
 
             return True
@@ -1723,6 +1802,24 @@ class MAC(DLBottom):
             
             
             
+    def _serializeSendBuffer(self):
+        """
+        Return the bitstream of the frame in the send buffer. A frame is complete when it
+        is put in the send buffer, so it is serialized only once even if the channel
+        access is retried many times (Backoff, TBTT report, restored MAC state).
+        
+        @rtype:     String
+        @return:    The serialized frame of the send buffer.
+        """
+        
+        frame, bitstream = self._serializedBuffer
+        if frame is not self._sendBuffer:
+            bitstream = self._sendBuffer.serialize()
+            self._serializedBuffer = (self._sendBuffer, bitstream)
+        return bitstream
+        
+        
+        
     def _saveMacState(self):
         """
         The present State of MAC is saved, because an higher priority operation must be made.
@@ -1777,7 +1874,7 @@ class MAC(DLBottom):
         """
     
         #QoS entity
-        if (self._niu.__class__ == QWNIC or self._niu.__class__ == QAP):
+        if self._isQoS:
     
             if self.AC_BK.transmissionQueue or self.AC_BE.transmissionQueue or \
             self.AC_VI.transmissionQueue or self.AC_VO.transmissionQueue:
@@ -1811,7 +1908,7 @@ class MAC(DLBottom):
             #Cancel the actual TBTT event
             CANCEL(self._beaconEventId)
         
-        print "%f : " %TIME() +self._niu._node.hostname +" : next TBTT = %f" %self._targetBeaconTxTime #debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : next TBTT = %f" %self._targetBeaconTxTime #debug
         
         #Set the next TBTT by event
         if self._beacon:
@@ -1829,7 +1926,7 @@ class MAC(DLBottom):
         #Set the next TBTT value
         self._targetBeaconTxTime = TIME() + self._bib.beaconInterval*self._TIME_UNIT
         
-        print "%f : " %TIME() +self._niu._node.hostname +" : next TBTT = %f" %self._targetBeaconTxTime #debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : next TBTT = %f" %self._targetBeaconTxTime #debug
         
         #Called again this same method to set the next TBTT
         if self._beacon:
@@ -1853,7 +1950,7 @@ class MAC(DLBottom):
         if not self._navEventId:
             #Start the NAV
             self._saveMacState()
-            print "%f : " %TIME() +self._niu._node.hostname +" : NEW NAV to %f" %(TIME()+lengthNAV) #debug
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : NEW NAV to %f" %(TIME()+lengthNAV) #debug
             
             if lengthNAV == 0:
                 #The period of NAV is unspecified
@@ -1864,7 +1961,7 @@ class MAC(DLBottom):
             #Update the NAV
             CANCEL(self._navEventId)
             if TIME() + lengthNAV < self._navEventId[0] - 3*self._MIN_UNIT or TIME() + lengthNAV > self._navEventId[0] + 3*self._MIN_UNIT:
-                print "%f : " %TIME() +self._niu._node.hostname +" : NAV update to %f" %(TIME()+lengthNAV) #debug
+                if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : NAV update to %f" %(TIME()+lengthNAV) #debug
         
         
         #Control than the NAV finish before the TBTT
@@ -1898,7 +1995,7 @@ class MAC(DLBottom):
             raise ValueError(self._niu._node.hostname  +": Not possible to end the NAV."
             +" The state of MAC is %i." %self._macState)
         
-        print "%f : " %TIME() +self._niu._node.hostname +" : End of NAV"
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : End of NAV"
         
         self._navEventId = None
         
@@ -1944,27 +2041,13 @@ class MAC(DLBottom):
         
         
         #Initialize the privates variables for the next transmission
-        if self._backoffEntityTransmit == "DCF":
-            self.DCF.shortRetryCount = 0
-            self.DCF.remainBackoffCTR = 0
-          
-        elif self._backoffEntityTransmit == "AC_BK":
-            self.AC_BK.shortRetryCount = 0
-            self.AC_BK.remainBackoffCTR = 0
-            
-        elif self._backoffEntityTransmit == "AC_BE":
-            self.AC_BE.shortRetryCount = 0
-            self.AC_BE.remainBackoffCTR = 0
-            
-        elif self._backoffEntityTransmit == "AC_VI":
-            self.AC_VI.shortRetryCount = 0
-            self.AC_VI.remainBackoffCTR = 0
-             
-        elif self._backoffEntityTransmit == "AC_VO":
-            self.AC_VO.shortRetryCount = 0
-            self.AC_VO.remainBackoffCTR = 0
+        backoffEntity = self._acMap.get(self._backoffEntityTransmit)
+        if backoffEntity is not None:
+            backoffEntity.shortRetryCount = 0
+            backoffEntity.remainBackoffCTR = 0
             
         self._sendBuffer = None
+        self._serializedBuffer = (None, None)
         self._backoffEntityTransmit = None
         self._applyBackoff = False
         self._macState = self._state.IDLE
@@ -2002,93 +2085,63 @@ class MAC(DLBottom):
         """
             
         #For QoS devices --> EDCA
-        if (self._niu.__class__ == QAP or self._niu.__class__ == QWNIC):
+        if self._isQoS:
             
             #Make virtual contention with internal passive Backoff
             #between the 4 Backoff entities. Use the remain Backoff if there is one.
             #Attribue the lowest priority fot the empty transmission queue.
             lowestPriority = self.AC_BK.EDCATable.AIFSN + self.AC_BK.EDCATable.CWmax
             
-            if self.AC_BK.transmissionQueue:
-                if self.AC_BK.remainBackoffCTR > 0:
-                    AC_BKBackoff = self._computeBackoff("AC_BK")
-                else:
-                    AC_BKBackoff = self.AC_BK.remainBackoffCTR
-            else:
-                AC_BKBackoff = lowestPriority
-                
-            if self.AC_BE.transmissionQueue:
-                if self.AC_BE.remainBackoffCTR > 0:
-                    AC_BEBackoff = self._computeBackoff("AC_BE")
-                else:
-                    AC_BEBackoff = self.AC_BE.remainBackoffCTR
-            else:
-                AC_BEBackoff = lowestPriority
-              
-            if self.AC_VO.transmissionQueue:
-                if self.AC_VO.remainBackoffCTR > 0:
-                    AC_VOBackoff = self._computeBackoff("AC_VO")
-                else:
-                    AC_VOBackoff = self.AC_VO.remainBackoffCTR
-            else:
-                AC_VOBackoff = lowestPriority
-             
-            if self.AC_VI.transmissionQueue:
-                if self.AC_VI.remainBackoffCTR > 0:
-                    AC_VIBackoff = self._computeBackoff("AC_VI")
+            #The highest priority and its number of entities are found in the same pass
+            backoffs = []
+            priorities = []
+            for index, ac in enumerate(_EDCA_ACS):
+                backoffEntity = self._acMap[ac]
+                if backoffEntity.transmissionQueue:
+                    if backoffEntity.remainBackoffCTR > 0:
+                        backoff = self._computeBackoff(ac)
+                    else:
+                        backoff = backoffEntity.remainBackoffCTR
                 else:
-                    AC_VIBackoff = self.AC_VI.remainBackoffCTR
-            else:
-                AC_VIBackoff = lowestPriority
-             
-            
-            #AC_XXpriority is not time value, only indicative value
-            AC_BKpriority = self.AC_BK.EDCATable.AIFSN + AC_BKBackoff
-            AC_BEpriority = self.AC_BE.EDCATable.AIFSN + AC_BEBackoff
-            AC_VIpriority = self.AC_VI.EDCATable.AIFSN + AC_VIBackoff
-            AC_VOpriority = self.AC_VO.EDCATable.AIFSN + AC_VOBackoff
+                    backoff = lowestPriority
+                backoffs.append(backoff)
+                #The priority is not time value, only indicative value
+                priority = backoffEntity.EDCATable.AIFSN + backoff
+                priorities.append(priority)
+                if index == 0 or priority < highestPriority:
+                    highestPriority = priority
+                    winIndex = index
+                    nbHighest = 1
+                elif priority == highestPriority:
+                    nbHighest += 1
             
             
             #Test if internal collision is present
-            priorityDic = {"AC_VO": AC_VOpriority, "AC_VI": AC_VIpriority, "AC_BE": AC_BEpriority, "AC_BK": AC_BKpriority}
-            highestPriority = min(priorityDic.values())
-            if priorityDic.values().count(highestPriority) > 1:
+            if nbHighest > 1:
                 #Internal Collision
-                print "%f : " %TIME() +self._niu._node.hostname +" : Internal Collision !!" #debug
+                if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Internal Collision !!" #debug
                 #Update the Retry Count for the collisioned Backoff Entity
-                for item in priorityDic.items():
-                    if item[1] == highestPriority:
-						eval("self." +item[0]).shortRetryCount += 1
+                for index, priority in enumerate(priorities):
+                    if priority == highestPriority:
+                        self._acMap[_EDCA_ACS[index]].shortRetryCount += 1
 
             #The win AC of virtual contention
             #If there is an internal collision it's the most priority is taken
             #AC_VO ==> AC_VI ==> AC_BE ==> AC_BK
-            winAC = priorityDic.items()[priorityDic.values().index(highestPriority)][0]
+            winAC = _EDCA_ACS[winIndex]
             
             #Use the compute Backoff to apply the real wait. Set this like a remain Backoff.
             self._backoffEntityTransmit = winAC
-            eval("self." + winAC).remainBackoffCTR = eval(winAC +"Backoff")
+            winBackoff = backoffs[winIndex]
+            self._acMap[winAC].remainBackoffCTR = winBackoff
             
             #Update the remain Backoff of the loser Backoff Entities
-            if self.AC_BK.transmissionQueue and AC_BK != winAC:
-                self.AC_BK.remainBackoffCTR = self.AC_BK.remainBackoffCTR - eval(winAC +"Backoff")
-                if self.AC_BK.remainBackoffCTR < 0:
-                    self.AC_BK.remainBackoffCTR = 1
-                
-            if self.AC_BE.transmissionQueue:
-                self.AC_BE.remainBackoffCTR = self.AC_BE.remainBackoffCTR - eval(winAC +"Backoff")
-                if self.AC_BE.remainBackoffCTR < 0:
-                    self.AC_BE.remainBackoffCTR = 1
-                
-            if self.AC_VO.transmissionQueue:
-                self.AC_VO.remainBackoffCTR = self.AC_VO.remainBackoffCTR - eval(winAC +"Backoff")
-                if self.AC_VO.remainBackoffCTR < 0:
-                    self.AC_VO.remainBackoffCTR = 1
-                
-            if self.AC_VI.transmissionQueue:
-                self.AC_VI.remainBackoffCTR = self.AC_VI.remainBackoffCTR - eval(winAC +"Backoff")
-                if self.AC_VI.remainBackoffCTR < 0:
-                    self.AC_VI.remainBackoffCTR = 1
+            #(the winner falls to 0: its Backoff is already applied by the contention)
+            for ac in _EDCA_ACS:
+                backoffEntity = self._acMap[ac]
+                if backoffEntity.transmissionQueue:
+                    remainBackoff = backoffEntity.remainBackoffCTR - winBackoff
+                    backoffEntity.remainBackoffCTR = remainBackoff if remainBackoff >= 0 else 1
              
             self._backoffEntityTransmit = winAC
             
@@ -2097,8 +2150,8 @@ class MAC(DLBottom):
             self._backoffEntityTransmit = "DCF"
         
 
-        lifeTimeEvent = eval("self." +self._backoffEntityTransmit).transmissionQueue[0][7]
-        print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i to send" %lifeTimeEvent[3] [0] #debug
+        lifeTimeEvent = self._acMap[self._backoffEntityTransmit].transmissionQueue[0][7]
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i to send" %lifeTimeEvent[3] [0] #debug
             
             
         #Construct and send the new frame
@@ -2173,14 +2226,15 @@ class MAC(DLBottom):
         assert(not self._sendBuffer)
         
         self._macState = self._state.SEND_DATA
+        backoffEntity = self._acMap[self._backoffEntityTransmit]
         
         #Obtain the informations of the current data frame
-        msduId, msdu, address1, address2, address3, priority, serviceClass, lifeTimeEvent = \
-        eval("self." +self._backoffEntityTransmit).transmissionQueue[0]
+        msduId, msdu, address1, address2, address3, priority, serviceClass, lifeTimeEvent, msduLength = \
+        backoffEntity.transmissionQueue[0]
         
         
         #Test the size of MSDU
-        if (len(msdu) > self._MAX_MSDUSIZE):
+        if (msduLength > self._MAX_MSDUSIZE):
             raise ValueError(self._niu._node.hostname +": The MSDU of the futur sended data is too large"
             +"(max: %i octets)" %self._MAX_MSDUSIZE)
         
@@ -2194,7 +2248,7 @@ class MAC(DLBottom):
         fc.type = self._frameType.DATA
         fc.subType = self._frameSubType.DATA
         #toDS and fromDS bits
-        if (self._niu.__class__ == AP) or (self._niu.__class__ == QAP):
+        if self._isAP:
             #(Q)AP to (Q)STA
             fc.toDS = 0
             fc.fromDS = 1
@@ -2203,7 +2257,7 @@ class MAC(DLBottom):
             fc.toDS = 1
             fc.fromDS = 0
         #Retry bit
-        if (eval("self." +self._backoffEntityTransmit).shortRetryCount == 0):
+        if (backoffEntity.shortRetryCount == 0):
             fc.retry = 0
         else:
             fc.retry = 1
@@ -2211,25 +2265,35 @@ class MAC(DLBottom):
     
                 
         #DURATION ID FIELD (to set the NAV)
-        if not eval("self." +self._backoffEntityTransmit).EDCATable.TXOPLimit and not self._cap:
+        if not backoffEntity.EDCATable.TXOPLimit and not self._cap:
             #EDCA TXOP One Frame Transmission
             frame.durationID = 0
         else:
             remainTXdata = 0.0
+            #The PHY timings are the same for every record of the queue
+            getTransmissionTime = self._niu.phy.getTransmissionTime
+            sifs = self._niu.phy.computeIFS()[0]
+            ackTime = getTransmissionTime(self._ACKSIZE)
+            twoSifs = 2*sifs
+            dataHeader = self._DATAHEADER
+            #Transmission time of the current frame, kept from the first pass of the loops
+            dataTime = None
             #First frame of EDCA TXOP Multiple Frame Transmission
             if not self._txop and not self._cap:
-                if len(eval("self." +self._backoffEntityTransmit).transmissionQueue) > 1:
+                if len(backoffEntity.transmissionQueue) > 1:
                     #If there is many frames in transmission queue
                     #Duration ID value (Ref 7.1.4)
-                    for record in eval("self." +self._backoffEntityTransmit).transmissionQueue:
-                        msdu = record[1]
-                        nextTxDuration = self._niu.phy.getTransmissionTime(len(msdu)+self._DATAHEADER) \
-                        + self._niu.phy.getTransmissionTime(self._ACKSIZE) + 2*self._niu.phy.computeIFS()[0]
-                        if remainTXdata + nextTxDuration < eval("self." +self._backoffEntityTransmit).EDCATable.TXOPLimit*1e-6:
+                    txopLimit = backoffEntity.EDCATable.TXOPLimit*1e-6
+                    for record in backoffEntity.transmissionQueue:
+                        recordTime = getTransmissionTime(record[8]+dataHeader)
+                        if dataTime is None:
+                            dataTime = recordTime
+                        nextTxDuration = recordTime + ackTime + twoSifs
+                        if remainTXdata + nextTxDuration < txopLimit:
                             remainTXdata = remainTXdata + nextTxDuration
                         else:
                             #DurationId is fixed with max TXOP (TXOP limit)
-                            remainTXdata = eval("self." +self._backoffEntityTransmit).EDCATable.TXOPLimit*1e-6
+                            remainTXdata = txopLimit
                             break
                             
                 #If there is only one frame in transmission queue, the TXOP is not set (= 0) ==> No NAV applied
@@ -2237,11 +2301,13 @@ class MAC(DLBottom):
             else:
                 #EDCA TXOP Multiple Frame Transmission or CAP
                 #Duration ID value (Ref 7.1.4)
-                for record in eval("self." +self._backoffEntityTransmit).transmissionQueue:
-                    msdu = record[1]
-                    nextTxDuration = self._niu.phy.getTransmissionTime(len(msdu)+self._DATAHEADER) \
-                    + self._niu.phy.getTransmissionTime(self._ACKSIZE) + 2*self._niu.phy.computeIFS()[0]
-                    if  remainTXdata + nextTxDuration < self._remainTXOP:
+                remainTXOP = self._remainTXOP
+                for record in backoffEntity.transmissionQueue:
+                    recordTime = getTransmissionTime(record[8]+dataHeader)
+                    if dataTime is None:
+                        dataTime = recordTime
+                    nextTxDuration = recordTime + ackTime + twoSifs
+                    if  remainTXdata + nextTxDuration < remainTXOP:
                         remainTXdata = remainTXdata + nextTxDuration
                     else: 
                         break
@@ -2252,13 +2318,11 @@ class MAC(DLBottom):
                     
             if remainTXdata != 0.0:
                 #The time of actual send procedure (SIFS + data) is soustracted for the Duration ID field
-                remainTXdata = remainTXdata - \
-                self._niu.phy.getTransmissionTime(len(eval("self." +self._backoffEntityTransmit).transmissionQueue[0][1])+self._DATAHEADER)\
-                - self._niu.phy.computeIFS()[0]
+                remainTXdata = remainTXdata - dataTime - sifs
 
             frame.durationID = int(remainTXdata*1e6)
             
-        print "%f : " %TIME() +self._niu._node.hostname +" : Duration ID = %i us" %frame.durationID #debugg
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Duration ID = %i us" %frame.durationID #debugg
                 
         
         
@@ -2272,13 +2336,13 @@ class MAC(DLBottom):
         sc.fragmentNb = 0
         #Increment the sequence number (if it's not a phy retransmission)
         if not self._retryEventId:
-            self._sequenceNb = (self._sequenceNb +1)%4096 #Count from 0 to 4095
+            self._sequenceNb = (self._sequenceNb +1) & 0xFFF #Count from 0 to 4095
         self._retryEventId = None
         sc.sequenceNb = self._sequenceNb
         frame.sequenceControl = sc.serialize()
         
         #QOS CONTROL FIELD
-        if (self._niu.__class__ == QWNIC or self._niu.__class__ == QAP):
+        if self._isQoS:
             qc = self.format.QosControl()
         
             #Priority
@@ -2290,7 +2354,7 @@ class MAC(DLBottom):
             #Give the information about the size of transmission queue of this current AC
             #EOSP
             qc.eosp = 1
-            qc.txopOrQueue = len(eval("self." +self._backoffEntityTransmit).transmissionQueue)
+            qc.txopOrQueue = len(backoffEntity.transmissionQueue)
             
             frame.qosControl = qc.serialize()
             
@@ -2299,7 +2363,7 @@ class MAC(DLBottom):
         frame.data = msdu
         
         #FRAME CHECK SEQUENCE FIELD
-        checksum = crc32(frame.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        checksum = _crc32(frame.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
         frame.FCS = checksum
     
         self._sendBuffer = frame
@@ -2324,7 +2388,7 @@ class MAC(DLBottom):
         """
         
         #Send only by QAP
-        if self._niu.__class__ != QAP:
+        if not self._isQAP:
             raise ValueError(self._niu._node.hostname  +": Not possible to send the QoS CF-Poll frame."
             +"The entity must be a QAP.")
         
@@ -2382,7 +2446,7 @@ class MAC(DLBottom):
         sc.fragmentNb = 0
         #Increment the sequence number (if it's not a phy retransmission)
         if not self._retryEventId:
-            self._sequenceNb = (self._sequenceNb +1)%4096 #Count from 0 to 4095
+            self._sequenceNb = (self._sequenceNb +1) & 0xFFF #Count from 0 to 4095
         self._retryEventId = None
         sc.sequenceNb = self._sequenceNb
         frame.sequenceControl = sc.serialize()
@@ -2401,7 +2465,7 @@ class MAC(DLBottom):
         None
         
         #FRAME CHECK SEQUENCE FIELD
-        checksum = crc32(frame.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        checksum = _crc32(frame.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
         frame.FCS = checksum
     
         self._sendBuffer = frame
@@ -2420,7 +2484,7 @@ class MAC(DLBottom):
         @return:    None
         """
         #Send only by QAP
-        if self._niu.__class__ != QAP:
+        if not self._isQAP:
             raise ValueError(self._niu._node.hostname  +": Not possible to send the CF-End frame."
             +"The entity must be a QAP.")
         
@@ -2453,7 +2517,7 @@ class MAC(DLBottom):
         cfEnd.BSSID = self._bib.bssId
 
         #FRAME CHECK SEQUENCE FIELD
-        checksum = crc32(cfEnd.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        checksum = _crc32(cfEnd.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
         cfEnd.FCS = checksum
 
         self._sendBuffer = cfEnd
@@ -2532,7 +2596,7 @@ class MAC(DLBottom):
         sc = self.format.SequenceControl()
         sc.fragmentNb = 0
         #Increment the sequence number
-        self._sequenceNb = (self._sequenceNb +1)%4096 #Count from 0 to 4095
+        self._sequenceNb = (self._sequenceNb +1) & 0xFFF #Count from 0 to 4095
         sc.sequenceNb = self._sequenceNb
         beacon.sequenceControl = sc.serialize()
         
@@ -2553,13 +2617,13 @@ class MAC(DLBottom):
         ci.iBSS = 0
         #Different Configurations
         #without QoS
-        if self._niu.__class__ == AP:
+        if self._isAP and not self._isQoS:
             ci.Qos = 0
             #DCF
             ci.CFPollable = 0
             ci.CFPollableRequest = 0
         #with QoS
-        elif self._niu.__class__ == QAP:
+        elif self._isQAP:
             ci.Qos = 1
             #EDCA
             ci.CFPollable = 0
@@ -2603,7 +2667,7 @@ class MAC(DLBottom):
         #FH, DS, CF and IBSS PARAMETER SET FIELDS are not integrate (optional fields)
         
         #QoS Fields
-        if self._niu.__class__ == QAP:
+        if self._isQAP:
             #QBSS LOAD FIELD id empty (not use)
             #It's only util for a futur roaming implementation and for statistics about load of network
             
@@ -2703,7 +2767,7 @@ class MAC(DLBottom):
         
         
         #FRAME CHECK SEQUENCE FIELD
-        checksum = crc32(beacon.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        checksum = _crc32(beacon.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
         beacon.FCS = checksum
        
        
@@ -2766,7 +2830,11 @@ class MAC(DLBottom):
             ack.receiverAddress = self._infoFramesCache[0][0]
 
         #FRAME CHECK SEQUENCE FIELD
-        checksum = crc32(ack.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        #Only the receiver address varies between ACK frames: compute its FCS once
+        checksum = self._ackFCSCache.get(ack.receiverAddress)
+        if checksum is None:
+            checksum = _crc32(ack.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
+            self._ackFCSCache[ack.receiverAddress] = checksum
         ack.FCS = checksum
 
         self._sendBuffer = ack
@@ -2815,21 +2883,21 @@ class MAC(DLBottom):
                 return
 
         
-        if eval("self." +self._backoffEntityTransmit).shortRetryCount >= self._mib.shortRetryLimit:
+        if self._acMap[self._backoffEntityTransmit].shortRetryCount >= self._mib.shortRetryLimit:
             #The transmission has failed : the max retransmission autorised is reached
             #Statistics update
             self.stat.framesAborded += 1
             
             #We delete the sended MSDU of the transmission queue
             if self._backoffEntityTransmit == "DCF":
-                eval("self." +self._backoffEntityTransmit).transmissionQueue.pop(0)
+                self._acMap[self._backoffEntityTransmit].transmissionQueue.popleft()
             else:
-                priority, serviceClasse = eval("self." +self._backoffEntityTransmit).transmissionQueue.pop(0)[5:7]
+                priority, serviceClasse = self._acMap[self._backoffEntityTransmit].transmissionQueue.popleft()[5:7]
             
             #Inform DL (LLC) and discard the frame
             srcMACAddr = self._mib.address
             #for (Q)AP
-            if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+            if self._isAP:
                 srcMACAddr = self._sendBuffer.address3
                 destMACAddr = self._sendBuffer.address1
             #for (Q)STA
@@ -2849,8 +2917,8 @@ class MAC(DLBottom):
             
             #Left the MAC sublayer
             self._txInProgress = False
-            print "%f : " %TIME() +self._niu._node.hostname +" : TX OFF" #debug
-            print " "
+            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : TX OFF" #debug
+            if DEBUG: print " "
             self._retryEventId = None
             self._terminMac()
             
@@ -2858,7 +2926,7 @@ class MAC(DLBottom):
         else:
             #Proceed to a new retransmission
             #Update the statistic
-            eval("self." +self._backoffEntityTransmit).shortRetryCount += 1
+            self._acMap[self._backoffEntityTransmit].shortRetryCount += 1
                 
             #A Backoff is applied for the next transmission
             self._applyBackoff = True
@@ -2908,8 +2976,8 @@ class MAC(DLBottom):
             raise ValueError(self._niu._node.hostname  +": Not possible to receive a data frame now."
             +" The state of MAC is %i." %self._macState)
         
-        print "%f : " %TIME() +self._niu._node.hostname +" : RX ON" #debug
-        print "%f : " %TIME() +self._niu._node.hostname +" : Receive Data" #@@debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : RX ON" #debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Receive Data" #@@debug
             
         #Send an ACK (unicast frame)
         self._sendAck()
@@ -2923,7 +2991,7 @@ class MAC(DLBottom):
         #Retrieve informations
         #Address
         #(Q)AP
-        if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+        if self._isAP:
             srcMACAddr = frame.address2
             destMACAddr = frame.address3
     
@@ -2935,13 +3003,13 @@ class MAC(DLBottom):
         
         #Priority & Service Class
         #With QoS
-        if (self._niu.__class__ == QWNIC or self._niu.__class__ == QAP):
+        if self._isQoS:
             qc = self.format.QosControl()
             qc.fill(frame.qosControl)
             priority = qc.tid
             serviceClass = qc.ackPolicy
             
-            if self._niu.__class__ == QAP and qc.eosp == 1:
+            if self._isQAP and qc.eosp == 1:
                 #Obtain the information about the size of transmission queue
                 if not self._hc.queueSize.has_key(srcMACAddr):
                     #NEW QSTA
@@ -2949,15 +3017,7 @@ class MAC(DLBottom):
                     for key in self._bib.staAddr:
                         self._hc.queueSize[key] = [0, 0, 0, 0] #Create a list for the 4 ACs
                           
-                if priority == 0: #AC_BE
-                    index=0
-                elif priority == 1 or priority == 2: #AC_BK
-                    index=1
-                elif priority == 3 or priority == 4 or priority == 5: #AC_VI
-                    index=2
-                elif priority == 6 or priority == 7: #AC_VO
-                    index=3
-                    
+                index = _AC_TO_QIDX[_PRIO_TO_AC[priority]]
                 self._hc.queueSize[srcMACAddr][index]= qc.txopOrQueue
 
       
@@ -2973,44 +3033,31 @@ class MAC(DLBottom):
         if destMACAddr != self._mib.address:
             #Place the redirected data frame in the queue of transmission
             #With QoS
-            if (self._niu.__class__ == QAP):
+            if self._isQAP:
                             
                 #Determine Access Category
-                if priority == 0:
-                    accessCategory = "AC_BE"
-                    index=0
-                
-                elif priority == 1 or priority == 2:
-                    accessCategory = "AC_BK"
-                    index=1
-                    
-                elif priority == 3 or priority == 4 or priority == 5:
-                    accessCategory = "AC_VI"
-                    index=2
-                    
-                elif priority == 6 or priority == 7:
-                    accessCategory = "AC_VO"
-                    index=3
+                accessCategory = _PRIO_TO_AC[priority]
+                index = _AC_TO_QIDX[accessCategory]
                  
                 #Update QAP queues informations for the HC                 
-                self._hc.queueSize[self._bib.apAddr][index] = len(eval("self." +accessCategory).transmissionQueue)
+                self._hc.queueSize[self._bib.apAddr][index] = len(self._acMap[accessCategory].transmissionQueue)
                 
                 #Increment the MSDU ID
                 self._msduId = (self._msduId +1)%256 #ID from 0 to 255
     
                 #Life time event
                 #When the life time is time up (MSDU will be discarded).
-                lifeTimeEvent = SCHEDULE(eval("self." +accessCategory).EDCATable.MSDULifeTime\
+                lifeTimeEvent = SCHEDULE(self._acMap[accessCategory].EDCATable.MSDULifeTime\
                 * self._TIME_UNIT, self._discardMsdu, (self._msduId, accessCategory))
                     
                 #Add an list of information in last place in Transmission Queue
-                eval("self." +accessCategory).transmissionQueue.append([self._msduId, frame.data, frame.address3, \
-                frame.address1, frame.address2, priority, serviceClass, lifeTimeEvent])
+                self._acMap[accessCategory].transmissionQueue.append([self._msduId, frame.data, frame.address3, \
+                frame.address1, frame.address2, priority, serviceClass, lifeTimeEvent, len(frame.data)])
 
                                       
                                          
             #Without QoS
-            elif (self._niu.__class__ == AP):
+            elif self._isAP:
                 #Add an tuple of information in last place in Transmission Queue
                 self.DCF.transmissionQueue.append(frame.data, frame.address3, frame.address1, frame.address2)
 
@@ -3068,9 +3115,9 @@ class MAC(DLBottom):
             +"The state of MAC is %i." %self._macState)
              
         self._txInProgress = False
-        print "%f : " %TIME() +self._niu._node.hostname +" : Receive Ack" #debug
-        print "%f : " %TIME() +self._niu._node.hostname +" : TX OFF" #debug
-        print " "
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Receive Ack" #debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : TX OFF" #debug
+        if DEBUG: print " "
         
         #We cancel the retransmission event
         if self._retryEventId:
@@ -3079,9 +3126,9 @@ class MAC(DLBottom):
             
         #We delete the sended MSDU of the transmission queue
         if self._backoffEntityTransmit == "DCF":
-            eval("self." +self._backoffEntityTransmit).transmissionQueue.pop(0)
+            self._acMap[self._backoffEntityTransmit].transmissionQueue.popleft()
         else:
-            priority, serviceClasse = eval("self." +self._backoffEntityTransmit).transmissionQueue.pop(0)[5:7]
+            priority, serviceClasse = self._acMap[self._backoffEntityTransmit].transmissionQueue.popleft()[5:7]
             
         #Statistics update about send (correspond to the last send data frame)
         self.stat.framesTransmittedOK += 1
@@ -3090,7 +3137,7 @@ class MAC(DLBottom):
         #Inform LLC of the transmission success
         srcMACAddr = self._mib.address
         #for (Q)AP
-        if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+        if self._isAP:
             destMACAddr = self._sendBuffer.address1
         #for (Q)STA
         else:
@@ -3111,9 +3158,9 @@ class MAC(DLBottom):
                
         #EDCA TXOP Management
         #Test if EDCA TXOP is longer than one transmission procedure
-        if eval("self." +self._backoffEntityTransmit).EDCATable.TXOPLimit != 0:
+        if self._acMap[self._backoffEntityTransmit].EDCATable.TXOPLimit != 0:
             #Test if there are still frames in the transmission queue
-            if len(eval("self." +self._backoffEntityTransmit).transmissionQueue) > 0:
+            if len(self._acMap[self._backoffEntityTransmit].transmissionQueue) > 0:
                 
                 #Compute the remain TXOP
                 #If we are in a EDCA TXOP period
@@ -3125,7 +3172,7 @@ class MAC(DLBottom):
                     #The current AC has obtained the EDCA TXOP (first frame)
                     self._txop = True
                     #Retrieve the first remain TXOP
-                    self._remainTXOP = eval("self." +self._backoffEntityTransmit).EDCATable.TXOPLimit * 1e-6 \
+                    self._remainTXOP = self._acMap[self._backoffEntityTransmit].EDCATable.TXOPLimit * 1e-6 \
                     - (TIME() - self._latestStartTransmitActivity)
         
                 #The TXOP must be terminated SIFS before the TBTT
@@ -3134,19 +3181,19 @@ class MAC(DLBottom):
                     self._remainTXOP = timeRemainToTBTT - self._niu.phy.computeIFS()[0] - self._MIN_UNIT
         
                 #Compute next total transmission time (DATA+ACK+2*SIFS)
-                nextTxDuration = self._niu.phy.getTransmissionTime(len(eval("self." +self._backoffEntityTransmit).transmissionQueue[0][1])+self._DATAHEADER) \
+                nextTxDuration = self._niu.phy.getTransmissionTime(self._acMap[self._backoffEntityTransmit].transmissionQueue[0][8]+self._DATAHEADER) \
                 + self._niu.phy.getTransmissionTime(self._ACKSIZE) + 2*self._niu.phy.computeIFS()[0]
 
                 
                 if  nextTxDuration < self._remainTXOP:
                     if self._txop:
-                        print "%f : " %TIME() +self._niu._node.hostname +" : EDCA TXOP : remainTXOP = %f" %self._remainTXOP +" nextTxDuration = %f" %nextTxDuration #debug
-                        lifeTimeEvent = eval("self." +self._backoffEntityTransmit).transmissionQueue[0][7]
-                        print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i (EDCA TXOP) to send" %lifeTimeEvent[3] [0] #debug
+                        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : EDCA TXOP : remainTXOP = %f" %self._remainTXOP +" nextTxDuration = %f" %nextTxDuration #debug
+                        lifeTimeEvent = self._acMap[self._backoffEntityTransmit].transmissionQueue[0][7]
+                        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i (EDCA TXOP) to send" %lifeTimeEvent[3] [0] #debug
                     elif self._cap:
-                        print "%f : " %TIME() +self._niu._node.hostname +" : CAP : remainCAP = %f" %self._remainTXOP +" nextTxDuration = %f" %nextTxDuration #debug
-                        lifeTimeEvent = eval("self." +self._backoffEntityTransmit).transmissionQueue[0][7]
-                        print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i (CAP) to send" %lifeTimeEvent[3] [0] #debug
+                        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : CAP : remainCAP = %f" %self._remainTXOP +" nextTxDuration = %f" %nextTxDuration #debug
+                        lifeTimeEvent = self._acMap[self._backoffEntityTransmit].transmissionQueue[0][7]
+                        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Select " +self._backoffEntityTransmit +" MSDU %i (CAP) to send" %lifeTimeEvent[3] [0] #debug
                         
                     
                     #Save the actual transmit Backoff Entity and cloture the transmission
@@ -3156,11 +3203,11 @@ class MAC(DLBottom):
                     #Send the next MSDU of the transmision queue of the current AC
                     self._backoffEntityTransmit = ActualBackoffEntity
                     self._txInProgress = True
-                    print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (receiveAck)" #debug
+                    if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : TX ON (receiveAck)" #debug
                     self._sendData()
                     return
                 else:
-                    print "%f : " %TIME() +self._niu._node.hostname +" : End of EDCA TXOP"
+                    if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : End of EDCA TXOP"
                     
         
         #The TXOP/CAP is finished (or no TXOP was applied)
@@ -3188,7 +3235,7 @@ class MAC(DLBottom):
         """   
         
         #Must be a QSTA to receive a QoS CF-Poll frame
-        if not self._niu.__class__ == QWNIC:                
+        if not self._isQSTA:
             return
             
 
@@ -3208,7 +3255,7 @@ class MAC(DLBottom):
             #We ignore this QoS CF-Poll frame
             return
     
-        print "%f : " %TIME() +self._niu._node.hostname +" : Receive QoS CF-Poll" #@@debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Receive QoS CF-Poll" #@@debug
         
         #We ignore the QoS CF-Poll if the state of MAC is WAIT_ACK
         if self._macState == self._state.WAIT_ACK:
@@ -3248,13 +3295,13 @@ class MAC(DLBottom):
                 #The MSDU is already constructed but not yet sended
                 if not self._navEventId:
                     #Compute next total transmission time (DATA+ACK+2*SIFS)
-                    nextTxDuration = self._niu.phy.getTransmissionTime(len(self._sendBuffer.serialize()))
+                    nextTxDuration = self._niu.phy.getTransmissionTime(len(self._serializeSendBuffer()))
                     + self._niu.phy.getTransmissionTime(self._ACKSIZE) + 2*self._niu.phy.computeIFS()[0]
                 
                 
                     if  nextTxDuration < self._remainTXOP:
-                        if  len(eval("self." +self._backoffEntityTransmit).transmissionQueue) > 1:
-                            print "%f : " %TIME() +self._niu._node.hostname +" : CAP : remainCAP = %f" %self._remainTXOP +\
+                        if  len(self._acMap[self._backoffEntityTransmit].transmissionQueue) > 1:
+                            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : CAP : remainCAP = %f" %self._remainTXOP +\
                             " nextTxDuration = %f" %nextTxDuration #debug
                         self._applyBackoff = False
                         self._startProcedureTime = TIME()
@@ -3285,7 +3332,7 @@ class MAC(DLBottom):
         """   
         
         #Must be a QSTA to receive a QoS CF-End frame
-        if not self._niu.__class__ == QWNIC:                
+        if not self._isQSTA:
             return
     
         #The state of MAC must be IDLE to receive an QoS CF-Poll frame
@@ -3293,7 +3340,7 @@ class MAC(DLBottom):
             raise ValueError(self._niu._node.hostname  +": Not possible to receive a CF-End frame now."
             +"The state of MAC is %i." %self._macState)
     
-        print "%f : " %TIME() +self._niu._node.hostname +" : Receive CF-End" #@@debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Receive CF-End" #@@debug
     
         #Parse the bitstream into an CF-End format
         cfEnd = self.format.CF-END()
@@ -3349,7 +3396,7 @@ class MAC(DLBottom):
             raise ValueError(self._niu._node.hostname  +": Not possible to receive a Beacon frame now."
             +"The state of MAC is %i." %self._macState)
             
-        print "%f : " %TIME() +self._niu._node.hostname +" : Receive Beacon" #@@debug
+        if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Receive Beacon" #@@debug
 
         #Data field
         data = self.BeaconDataFormat()
@@ -3368,7 +3415,7 @@ class MAC(DLBottom):
 
         
         #Read the Qos fields if the entity have the QoS capacity
-        if ci.Qos and (self._niu.__class__ == QWNIC):
+        if ci.Qos and self._isQSTA:
         
             #EDCA Parameter Set
             edcaElement = self._Element
@@ -3450,7 +3497,7 @@ class MAC(DLBottom):
         addrNoMatch = False
         
         #for (Q)AP
-        if (self._niu.__class__ == AP or self._niu.__class__ == QAP):
+        if self._isAP:
             if (destAddr != self._bib.bssId):
                 #The frame is not destinated for this (Q)AP or there is error in address field
                 addrNoMatch = True
@@ -3538,7 +3585,7 @@ class MAC(DLBottom):
                     #Statistics update
                     self.stat.duplicateFramesReceived += 1
                     self.stat.octetsReceivedError += len(frame.data)
-                    print "%f : " %TIME() +self._niu._node.hostname +" : The frame received is a duplicate Data" #@@debug
+                    if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : The frame received is a duplicate Data" #@@debug
                     return True
         
         
@@ -3667,7 +3714,7 @@ class MAC(DLBottom):
         """
         
         #Control the FCS
-        checksum = crc32(frame.serialize()[0:-4]) & ((1L<<32)-1) #Take lower 32 bit
+        checksum = _crc32(frame.serialize()[0:-4]) & 0xFFFFFFFF #Take lower 32 bit
         return (frame.FCS == checksum)
             
     
@@ -3688,13 +3735,13 @@ class MAC(DLBottom):
             #Execute Backoff only when we must apply
             if self._applyBackoff:
     
-                if (eval("self." +self._backoffEntityTransmit).remainBackoffCTR == 0):
+                if (self._acMap[self._backoffEntityTransmit].remainBackoffCTR == 0):
                     #With a new Backoff
                     backoff = self._computeBackoff(self._backoffEntityTransmit) * self._niu.phy.getSlotTime()
     
                 else:
                     #With the remain Backoff
-                    backoff = eval("self." +self._backoffEntityTransmit).remainBackoffCTR* self._niu.phy.getSlotTime()
+                    backoff = self._acMap[self._backoffEntityTransmit].remainBackoffCTR* self._niu.phy.getSlotTime()
                     
     
                 #Report the transmission if the next TBTT is encroached by the backoff (called by channelIdle())
@@ -3705,19 +3752,19 @@ class MAC(DLBottom):
                             +" but TBTT will be encroached (Test must be made in method ReceiveACK)")
                         else:    
                             #Use the remain Backoff
-                            eval("self." +self._backoffEntityTransmit).remainBackoffCTR = int(self._targetBeaconTxTime - TIME()\
+                            self._acMap[self._backoffEntityTransmit].remainBackoffCTR = int(self._targetBeaconTxTime - TIME()\
                             - self._niu.phy.computeIFS()[0]/self._niu.phy.getSlotTime() + 1) # round up
                                 
                             #The transmission is reported after the reception of beacon
                             #will be recalled by mac.channelIdle()
-                            print "%f : " %TIME() +self._niu._node.hostname +" : The transmission is reported after the reception of beacon. TBTT: %f (Backoff)"\
+                            if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : The transmission is reported after the reception of beacon. TBTT: %f (Backoff)"\
                             %self._targetBeaconTxTime #@@debug
                             self._applyBackoff = True
                             
                         return True
                         
                 #The Backoff can be applied
-                print "%f : " %TIME() +self._niu._node.hostname +" : Backoff Value: " +str(backoff)#debug
+                if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : Backoff Value: " +str(backoff)#debug
                 self._backoffEventId = SCHEDULE(backoff, self._endBackoff)
                 return True
             
@@ -3744,10 +3791,13 @@ class MAC(DLBottom):
         @return:    Random backing Off in Slot Time
         """
 
-        CW = min(eval("self." +entity).EDCATable.CWmax, 2**eval("self." +entity).shortRetryCount \
-        *(eval("self." +entity).EDCATable.CWmin + 1) - 1)
-        backoff = randint(0,CW)
-        return backoff
+        CW = min(self._acMap[entity].EDCATable.CWmax, 2**self._acMap[entity].shortRetryCount \
+        *(self._acMap[entity].EDCATable.CWmin + 1) - 1)
+        #The backoffs are drawn by numpy in batches for each CW
+        draws = self._backoffDraws.get(CW)
+        if not draws:
+            draws = self._backoffDraws[CW] = numpy.random.randint(0, CW+1, self._BACKOFF_BATCH).tolist()
+        return draws.pop()
 
         
 
@@ -3775,7 +3825,7 @@ class MAC(DLBottom):
         if self._backoffEventId[0] > TIME():
             #The Backoff was canceled because a data frame is arrived before the end of Backoff.
             #Retrieve the Remain Backing Off.
-            eval("self." +self._backoffEntityTransmit).remainBackoffCTR = int((self._backoffEventId[0] - \
+            self._acMap[self._backoffEntityTransmit].remainBackoffCTR = int((self._backoffEventId[0] - \
             self._niu.phy.getTimeLastReceiveActivity()) / self._niu.phy.getSlotTime() + 1) #Round up
                 
             #The Backoff period is left
@@ -3790,10 +3840,10 @@ class MAC(DLBottom):
         elif self._niu.phy.carrierSense():
             #The channel is Busy
             #Retrieve the Remain Backing Off for the next Backoff of this reported transmission.
-            eval("self." +self._backoffEntityTransmit).remainBackoffCTR = int((TIME() - \
+            self._acMap[self._backoffEntityTransmit].remainBackoffCTR = int((TIME() - \
             self._niu.phy.getTimeLastReceiveActivity()) / self._niu.phy.getSlotTime() + 1)  # round up
                 
-            if (eval("self." +self._backoffEntityTransmit).remainBackoffCTR > self._niu.phy.getCW('max')):
+            if (self._acMap[self._backoffEntityTransmit].remainBackoffCTR > self._niu.phy.getCWmax()):
                 raise ValueError(self._niu._node.hostname +": The compute remain Backoff is not possible.")
 
             #The Backoff period is left
@@ -3805,7 +3855,7 @@ class MAC(DLBottom):
 
         else:
             #The channel is Idle and no data frame was received. The frame will be send.
-            eval("self." +self._backoffEntityTransmit).remainBackoffCTR = 0
+            self._acMap[self._backoffEntityTransmit].remainBackoffCTR = 0
                 
             #The Backoff period is left
             self._backoffEventId = None
@@ -3876,21 +3926,21 @@ class MAC(DLBottom):
     
         #Search ID in the Buffer
         index=0
-        for msdu in eval("self."+ac).transmissionQueue:
+        for msdu in self._acMap[ac].transmissionQueue:
             if msdu[0] == id:
                 #Set 2 EDCA parameters if the MSDU is the first in transmission queue
-                if msdu == eval("self."+ac).transmissionQueue[0]:
-                    eval("self."+ac).remainBackoffCTR = 0
-                    eval("self."+ac).shortRetryCount = 0
+                if msdu == self._acMap[ac].transmissionQueue[0]:
+                    self._acMap[ac].remainBackoffCTR = 0
+                    self._acMap[ac].shortRetryCount = 0
            
                 #If the MSDU to discarded is the actual MSDU in transmission
                 #it is not discarded now
                 if self._macState == self._state.SEND_DATA and index == 0:
                     #New Life time event
-                    lifeTimeEvent = SCHEDULE(eval("self." +ac).EDCATable.MSDULifeTime\
+                    lifeTimeEvent = SCHEDULE(self._acMap[ac].EDCATable.MSDULifeTime\
                     * self._TIME_UNIT, self._discardMsdu, (id, ac))
                     #Update the Life Time Event
-                    eval("self." +ac).transmissionQueue[0][7] = lifeTimeEvent
+                    self._acMap[ac].transmissionQueue[0][7] = lifeTimeEvent
                     return
             
                 #If we are in TXOP period and the MSDU is the second of the 
@@ -3898,16 +3948,16 @@ class MAC(DLBottom):
                 #of the destination STA)
                 if self._txop or self._cap and index == 1:
                     #New Life time event
-                    lifeTimeEvent = SCHEDULE(eval("self." +ac).EDCATable.MSDULifeTime\
+                    lifeTimeEvent = SCHEDULE(self._acMap[ac].EDCATable.MSDULifeTime\
                     * self._TIME_UNIT, self._discardMsdu, (id, ac))
                     #Update the Life Time Event
-                    eval("self." +ac).transmissionQueue[1][7] = lifeTimeEvent
+                    self._acMap[ac].transmissionQueue[1][7] = lifeTimeEvent
                     return
                    
                 
                 #Discard MSDU
-                print "%f : " %TIME() +self._niu._node.hostname +" : " +ac +" MSDU %i is discarted." %id #debug
-                eval("self." +ac).transmissionQueue.pop(index)
+                if DEBUG: print "%f : " %TIME() +self._niu._node.hostname +" : " +ac +" MSDU %i is discarted." %id #debug
+                del self._acMap[ac].transmissionQueue[index]
                 self.stat.msduDeleted += 1
                 return
             index += 1
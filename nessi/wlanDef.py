@@ -39,11 +39,12 @@ __all__ = ["PhyModulation", "MacMIB", "BackoffEntity", "EDCATable", "BSSInfoBase
 
 
 from random import random
+from collections import deque
 from pdu import formatFactory
 
 
 
-class PhyModulation:
+class PhyModulation(object):
     """
     The attributes defined in this class corresponds to the constants of
     the 3 differents modulations employed for 802.11, 802.11b and 802.11g:
@@ -52,6 +53,10 @@ class PhyModulation:
         - OFDM
     """
     
+    __slots__ = ("sifsTime", "slotTime", "cwMin", "cwMax",
+                 "preambleLength", "plcpHeaderLength")
+    """The PHY reads the constants for every frame: no instance dictionary."""
+    
     def __init__(self):
         """FHSS is the default value (for 1 Mbps)"""
 
@@ -335,8 +340,9 @@ class BackoffEntity:
         for the selected Access Category.
         """
     
-        self.transmissionQueue = []
-        """Queue of MSDU transmission."""
+        self.transmissionQueue = deque()
+        """Queue of MSDU transmission. With QoS, each entry is the list [msduId, msdu, address1,
+        address2, address3, priority, serviceClass, lifeTimeEvent, msduLength]."""
         
         self.remainBackoffCTR = 0 #[TU]
         """Time Unit remaining of the current Backoff. Use for the next transmision attempt."""